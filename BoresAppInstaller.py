@@ -1,41 +1,2557 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
-import requests
 import subprocess
 import os
 import json
 import sys
-import ctypes
-from collections import defaultdict, OrderedDict
-
-# Load apps from JSON
-with open("apps.json", "r") as f:
-    raw_json = json.load(f)
-
-# Group apps by the 'category' field inside each app, keep categories in original order, sort apps alphabetically
-apps_by_category = defaultdict(dict)
-category_order = []
-for top_level in raw_json.values():
-    for app_name, app_data in top_level.items():
-        cat = app_data.get("category", "Other")
-        if cat not in apps_by_category:
-            category_order.append(cat)
-        apps_by_category[cat][app_name] = app_data
-# Only sort apps alphabetically, not categories
-apps_by_category = OrderedDict((cat, OrderedDict(sorted(apps.items()))) for cat, apps in apps_by_category.items() if cat in category_order)
-# Move 'Other' to the end
-if 'Other' in category_order:
-    category_order = [c for c in category_order if c != 'Other'] + ['Other']
-apps_by_category = OrderedDict((cat, apps_by_category[cat]) for cat in category_order if cat in apps_by_category)
-
-os.makedirs("installers", exist_ok=True)
-
-def run_as_admin(exe, params=''):
+import threading
+import atexit
+import time
+import queue
+import hashlib
+import random
+import re
+import pickle
+import gc
+import bisect
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed, wait
+from functools import partial
+from urllib.parse import urlsplit
+
+# tkinter is bound by load_tk() when the GUI starts, so headless runs and library
+# imports never load it (or PIL, which is only imported to resize new icons)
+tk = ttk = messagebox = None
+
+def load_tk():
+    global tk, ttk, messagebox
+    import tkinter
+    from tkinter import ttk as tk_ttk, messagebox as tk_messagebox
+    tk, ttk, messagebox = tkinter, tk_ttk, tk_messagebox
+
+# requests takes longer to import than the rest of the module together, so it is bound by
+# load_requests() when the first DownloadEngine is created instead of at startup
+requests = None
+
+def load_requests():
+    global requests
+    if requests is None:
+        import requests.adapters  # binds the global name to the requests package
+    return requests
+
+class Catalog:
+    # The app list shared by the GUI and anything else that needs it.
+    # Categories keep their order from apps.json ('Other' last) and apps are sorted by name
+    # inside each category. Every app gets an id that stays the same while the catalog is
+    # alive, so two apps with the same name in different categories never collide.
+    # Edits are recorded in self.changes until the catalog is saved, as JSON-ready dicts that
+    # apply() can replay (that is what the edit journal in apps.json.journal holds).
+    def __init__(self):
+        self.apps = {}  # app_id: {"id", "name", "category", "data"}
+        self.categories = OrderedDict()  # category: [app_id, ...] sorted by name
+        self.by_name = {}  # app_name: [app_id, ...] in category order
+        self.changes = []  # {"op", ...} since the last save, see apply()
+        self.revision = 0  # bumped on every change, lets indexes tell when they are stale
+        self.next_id = 1
+        self.source_text = None  # apps.json as it was read by load(), kept for "Revert to Default"
+
+    @classmethod
+    def load(cls, path="apps.json", cache=True):
+        # The file is read and parsed at most once; the text is kept so reverting doesn't re-read it.
+        # With cache on, the grouped and sorted catalog is also kept in apps.json.cache, keyed by the
+        # file's sha256, and loaded from there next time. Hashing is cheap next to parsing, and
+        # unlike mtime and size it can't be fooled by a same-size copy that kept its timestamp;
+        # the stat is only stored to tell when the cache needs rewriting.
+        st = os.stat(path)
+        stat_key = (st.st_mtime_ns, st.st_size)
+        compiled = read_compiled_catalog(path + CATALOG_CACHE_SUFFIX) if cache else None
+        with open(path, "r") as f:
+            text = f.read()
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if compiled and compiled["sha256"] == digest:
+            catalog = cls.from_compiled(compiled)
+            if compiled["stat"] != stat_key:
+                catalog.compile(path + CATALOG_CACHE_SUFFIX, stat_key, digest)  # touched but not changed
+        else:
+            catalog = cls.from_json(json.loads(text))
+            catalog.source_text = text
+            if cache:
+                catalog.compile(path + CATALOG_CACHE_SUFFIX, stat_key, digest)
+        # Edits that were journaled but not yet folded into apps.json
+        if catalog.replay(path + JOURNAL_SUFFIX):
+            catalog.source_text = json.dumps(catalog.to_json(), indent=2)
+        return catalog
+
+    def replay(self, journal_path):
+        # Applies every complete line of an edit journal; returns how many were applied
+        try:
+            with open(journal_path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0
+        applied = 0
+        for line in lines:
+            try:
+                change = json.loads(line)
+            except ValueError:
+                break  # a write cut short by a crash; nothing after it was committed
+            self.apply(change)
+            applied += 1
+        self.mark_clean()
+        return applied
+
+    def apply(self, change):
+        # Replays one recorded change. Every op is idempotent, so replaying a journal
+        # whose edits already reached apps.json is harmless.
+        op = change["op"]
+        if op == "put":
+            existing = self.find(change["name"], change.get("from", change["category"]))
+            if existing:
+                self.update(existing["id"], change["data"], change["category"])
+            else:
+                self.add(change["name"], change["data"], change["category"])
+        elif op == "remove":
+            existing = self.find(change["name"], change["category"])
+            if existing:
+                self.remove(existing["id"])
+        elif op == "add_category":
+            self.add_category(change["category"])
+        elif op == "remove_category":
+            self.remove_category(change["category"], change["move_to"])
+
+    @classmethod
+    def from_json(cls, raw_json):
+        catalog = cls()
+        catalog.fill(raw_json)
+        return catalog
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        catalog = cls()
+        catalog.apps = compiled["apps"]
+        catalog.categories = compiled["categories"]
+        catalog.by_name = compiled["by_name"]
+        catalog.next_id = compiled["next_id"]
+        catalog.source_text = compiled["text"]
+        return catalog
+
+    def compile(self, cache_path, stat_key, digest):
+        # Save the grouped state for Catalog.load; a cache that can't be written is only slower
+        compiled = {
+            "version": CATALOG_CACHE_VERSION,
+            "stat": stat_key,
+            "sha256": digest,
+            "text": self.source_text,
+            "apps": self.apps,
+            "categories": self.categories,
+            "by_name": self.by_name,
+            "next_id": self.next_id,
+        }
+        tmp_path = cache_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not write catalog cache {cache_path}: {e}")
+
+    def fill(self, raw_json):
+        # Group apps by the 'category' field inside each app, keep categories in original order, sort apps alphabetically
+        grouped = OrderedDict()
+        for top_level in raw_json.values():
+            for app_name, app_data in top_level.items():
+                grouped.setdefault(app_data.get("category", "Other"), {})[app_name] = app_data
+        # Move 'Other' to the end
+        if "Other" in grouped:
+            grouped.move_to_end("Other")
+        for category, apps in grouped.items():
+            ids = self.categories[category] = []
+            for app_name in sorted(apps):
+                app_id = self.next_id
+                self.next_id += 1
+                self.apps[app_id] = {"id": app_id, "name": app_name, "category": category, "data": apps[app_name]}
+                self.by_name.setdefault(app_name, []).append(app_id)
+                ids.append(app_id)
+
+    def reset(self, raw_json):
+        # Replace the whole app list (e.g. Revert to Default)
+        self.apps.clear()
+        self.categories.clear()
+        self.by_name.clear()
+        self.fill(raw_json)
+        self.record({"op": "reset"})
+
+    def to_json(self):
+        # Rebuild the apps.json structure: {category: {app_name: data}}
+        out = {}
+        for category, ids in self.categories.items():
+            out[category] = {self.apps[app_id]["name"]: self.apps[app_id]["data"] for app_id in ids}
+        return out
+
+    def get(self, app_id):
+        return self.apps.get(app_id)
+
+    def find(self, name, category=None):
+        # First app with this name (in the given category, if any), or None
+        for app_id in self.by_name.get(name, ()):
+            entry = self.apps[app_id]
+            if category is None or entry["category"] == category:
+                return entry
+        return None
+
+    def label(self, app_id):
+        # The app's name, plus its category when another app has the same name. Unique, so it
+        # names the app's installer file and cache entry and tells duplicates apart when typed.
+        entry = self.apps[app_id]
+        if len(self.by_name.get(entry["name"], ())) < 2:
+            return entry["name"]
+        return f"{entry['name']} ({entry['category']})"
+
+    def find_label(self, label):
+        # The app a label() names; a plain name that several apps share gives the first of them
+        match = re.fullmatch(r"(.*) \((.*)\)", label)
+        return (match and self.find(match.group(1), match.group(2))) or self.find(label)
+
+    def category_names(self):
+        return list(self.categories.keys())
+
+    def entries(self, category):
+        return [self.apps[app_id] for app_id in self.categories.get(category, ())]
+
+    def __iter__(self):
+        # All apps in display order
+        for ids in self.categories.values():
+            for app_id in ids:
+                yield self.apps[app_id]
+
+    def __len__(self):
+        return len(self.apps)
+
+    def add(self, name, data, category):
+        # Adds an app, or replaces the one with the same name in that category
+        existing = self.find(name, category)
+        if existing:
+            return self.update(existing["id"], data, category)
+        data["category"] = category
+        app_id = self.next_id
+        self.next_id += 1
+        self.apps[app_id] = {"id": app_id, "name": name, "category": category, "data": data}
+        self.by_name.setdefault(name, []).append(app_id)
+        self.insert_sorted(app_id)
+        self.record({"op": "put", "name": name, "category": category, "data": data})
+        return app_id
+
+    def update(self, app_id, data, category=None):
+        # Moving an app into a category that already has one with its name replaces that one,
+        # as writing it into that category of apps.json would
+        entry = self.apps[app_id]
+        category = category or entry["category"]
+        data["category"] = category
+        change = {"op": "put", "name": entry["name"], "category": category, "data": data}
+        if category != entry["category"]:
+            change["from"] = entry["category"]
+            existing = self.find(entry["name"], category)
+            if existing:
+                self.remove(existing["id"])
+            self.unlink(app_id)
+            entry["category"] = category
+            self.insert_sorted(app_id)
+        entry["data"] = data
+        self.record(change)
+        return app_id
+
+    def remove(self, app_id):
+        self.unlink(app_id)
+        entry = self.apps.pop(app_id)
+        ids = self.by_name[entry["name"]]
+        ids.remove(app_id)
+        if not ids:
+            del self.by_name[entry["name"]]
+        self.record({"op": "remove", "name": entry["name"], "category": entry["category"]})
+        return entry
+
+    def add_category(self, category):
+        if category not in self.categories:
+            self.categories[category] = []
+            self.record({"op": "add_category", "category": category})
+
+    def remove_category(self, category, move_to="Uncategorized"):
+        # Moves the category's apps to move_to instead of deleting them (see update for name clashes)
+        for app_id in list(self.categories.get(category, ())):
+            self.update(app_id, self.apps[app_id]["data"], move_to)
+        self.categories.pop(category, None)
+        self.record({"op": "remove_category", "category": category, "move_to": move_to})
+
+    def insert_sorted(self, app_id):
+        entry = self.apps[app_id]
+        ids = self.categories.setdefault(entry["category"], [])
+        bisect.insort(ids, app_id, key=lambda i: self.apps[i]["name"])
+
+    def unlink(self, app_id):
+        # Take the app out of its category list, dropping the category if it becomes empty
+        category = self.apps[app_id]["category"]
+        ids = self.categories.get(category)
+        if ids and app_id in ids:
+            ids.remove(app_id)
+            if not ids:
+                del self.categories[category]
+
+    def record(self, change):
+        self.changes.append(change)
+        self.revision += 1
+
+    @property
+    def dirty(self):
+        return bool(self.changes)
+
+    def mark_clean(self):
+        changes = self.changes
+        self.changes = []
+        return changes
+
+SEARCH_PREFIX_MAX = 10  # longest word prefix kept in the search index
+
+class SearchIndex:
+    # Prefix and trigram index over app names and categories. Building it for a big catalog
+    # takes a few hundred ms, so it is rebuilt on a background thread from a snapshot whenever
+    # the catalog changes; until then searches fall back to a plain scan.
+    # search() narrows the previous result when the query only grew (once its words are long
+    # enough to match as substrings), looking up only the words that changed.
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.revision = None  # catalog revision the index was built from
+        self.building = None  # revision a background build is working on
+        self.texts = {}  # app_id: "name category" lowercased
+        self.prefixes = {}  # word prefix: set of app ids
+        self.trigrams = {}  # trigram: set of app ids
+        self.sorted_names = []  # (lowercase name, name) for autocomplete
+        self.names_revision = None
+        self.last_query = None
+        self.last_result = None
+
+    def snapshot(self):
+        return self.catalog.revision, [(e["id"], e["name"], e["category"]) for e in self.catalog]
+
+    def build(self, snapshot=None):
+        revision, rows = snapshot or self.snapshot()
+        texts = {}
+        prefixes = {}
+        trigrams = {}
+        for app_id, name, category in rows:
+            text = f"{name} {category}".lower()
+            texts[app_id] = text
+            keys = set()
+            for word in set(re.findall(r"\w+", text)):
+                keys.update(word[:i] for i in range(1, min(len(word), SEARCH_PREFIX_MAX) + 1))
+            for key in keys:
+                bucket = prefixes.get(key)
+                if bucket is None:
+                    prefixes[key] = {app_id}
+                else:
+                    bucket.add(app_id)
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                bucket = trigrams.get(gram)
+                if bucket is None:
+                    trigrams[gram] = {app_id}
+                else:
+                    bucket.add(app_id)
+        self.texts, self.prefixes, self.trigrams = texts, prefixes, trigrams
+        self.last_query = self.last_result = None
+        self.revision = revision
+
+    def build_async(self):
+        if self.revision == self.catalog.revision or self.building == self.catalog.revision:
+            return
+        snapshot = self.snapshot()
+        self.building = snapshot[0]
+        threading.Thread(target=self.build, args=(snapshot,), daemon=True).start()
+
+    def search(self, query):
+        # Returns the set of matching app ids, or None when the query is empty (no filter)
+        query = " ".join(query.lower().split())
+        if not query:
+            return None
+        tokens = query.split(" ")
+        if self.revision != self.catalog.revision:
+            self.build_async()
+            rows = [(e["id"], f"{e['name']} {e['category']}".lower()) for e in self.catalog]
+            for token in tokens:
+                test = self.matcher(token)
+                rows = [row for row in rows if test(row[1])]
+            return {app_id for app_id, _ in rows} or self.fuzzy_scan(query)
+        # Narrowing only works while every earlier token was already matched as a substring:
+        # a 1-2 letter token only matches word starts, so "wi" can miss what "win" finds.
+        # Only the tokens that are new or grew are looked up, and their hits intersected with
+        # the previous result, which costs no more than a fresh lookup however big that result is.
+        last_tokens = self.last_query.split(" ") if self.last_query else []
+        if (self.last_result is not None and last_tokens and query.startswith(self.last_query)
+                and all(len(token) >= 3 for token in last_tokens)):
+            result = self.last_result
+            for token in set(tokens) - set(last_tokens):
+                result = result & self.token_matches(token)
+                if not result:
+                    break
+        else:
+            result = None
+            for token in tokens:
+                hits = self.token_matches(token)
+                result = hits if result is None else result & hits
+                if not result:
+                    break
+        if result:
+            self.last_query, self.last_result = query, result
+            return result
+        # Nothing matched exactly: fall back to trigram similarity for typos
+        self.last_query, self.last_result = None, None
+        return self.fuzzy(query)
+
+    def token_matches(self, token):
+        hits = set(self.prefixes.get(token[:SEARCH_PREFIX_MAX], ()))
+        if len(token) > SEARCH_PREFIX_MAX:
+            hits = {app_id for app_id in hits if token in self.texts[app_id]}
+        if len(token) >= 3:
+            # Substring matches inside words (e.g. "tree" in "WizTree")
+            candidates = None
+            for i in range(len(token) - 2):
+                ids = self.trigrams.get(token[i:i + 3], set())
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    break
+            hits |= {app_id for app_id in candidates or () if token in self.texts[app_id]}
+        return hits
+
+    def matcher(self, token):
+        # A test for one lowercased text, with the rule token_matches applies: word prefix,
+        # or any substring once 3+ characters long
+        if len(token) >= 3:
+            return lambda text: token in text
+        search = re.compile(r"\b" + re.escape(token)).search
+        return lambda text: token in text and search(text) is not None  # the plain check rules most texts out cheaply
+
+    def fuzzy(self, query, threshold=0.6):
+        grams = {query[i:i + 3] for i in range(len(query) - 2)}
+        if not grams:
+            return set()
+        counts = {}
+        for gram in grams:
+            for app_id in self.trigrams.get(gram, ()):
+                counts[app_id] = counts.get(app_id, 0) + 1
+        return {app_id for app_id, n in counts.items() if n / len(grams) >= threshold}
+
+    def fuzzy_scan(self, query, threshold=0.6):
+        # fuzzy() without the index
+        grams = {query[i:i + 3] for i in range(len(query) - 2)}
+        if not grams:
+            return set()
+        result = set()
+        for e in self.catalog:
+            text = f"{e['name']} {e['category']}".lower()
+            if sum(gram in text for gram in grams) / len(grams) >= threshold:
+                result.add(e["id"])
+        return result
+
+    def complete(self, prefix, limit=10):
+        # App names starting with prefix, alphabetically (labels for names several apps share)
+        if self.names_revision != self.catalog.revision:
+            labels = {self.catalog.label(app_id) for app_ids in self.catalog.by_name.values() for app_id in app_ids}
+            self.sorted_names = sorted((label.lower(), label) for label in labels)
+            self.names_revision = self.catalog.revision
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.sorted_names, (prefix,))
+        out = []
+        for lower, name in self.sorted_names[start:]:
+            if not lower.startswith(prefix) or len(out) >= limit:
+                break
+            out.append(name)
+        return out
+
+# Compiled catalog cache, see Catalog.load
+CATALOG_CACHE_SUFFIX = ".cache"  # apps.json.cache
+CATALOG_CACHE_VERSION = 1  # bump when the Catalog layout changes so old caches are rebuilt
+
+def read_compiled_catalog(cache_path):
+    # The cache's contents, or None if it is missing, unreadable or from another version
+    # The collector is paused while unpickling: hundreds of thousands of small dicts would
+    # otherwise trigger repeated full collections that cost more than the load itself
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(cache_path, "rb") as f:
+            compiled = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring catalog cache {cache_path}: {e}")
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    if not isinstance(compiled, dict) or compiled.get("version") != CATALOG_CACHE_VERSION:
+        return None
+    return compiled
+
+# The catalog the GUI works on; set by load_catalog() so importing this module has no side effects
+catalog = None
+
+def load_catalog(path="apps.json"):
+    global catalog
+    catalog = Catalog.load(path)
+    return catalog
+
+# Catalog persistence settings
+JOURNAL_SUFFIX = ".journal"  # apps.json.journal holds edits not yet folded into apps.json
+JOURNAL_MAX_BYTES = 256 * 1024  # compact the journal into apps.json once it grows past this
+
+class CatalogStore:
+    # Writes catalog edits back to apps.json without rewriting the whole file every time.
+    # save() appends the edits recorded since the last call to the journal, one JSON line each,
+    # so a small edit costs a few hundred bytes; callers decide how long to coalesce edits before
+    # calling it (the GUI waits SAVE_DELAY_MS of quiet). The journal is folded into apps.json when
+    # it gets big, after a reset and on exit. Full writes go to a temp file that is os.replace'd
+    # over apps.json, so a crash leaves either the old or the new file, never a truncated one.
+    # With journal=False every save() is a full write.
+    def __init__(self, catalog, path="apps.json", journal=True):
+        self.catalog = catalog
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX if journal else None
+        self.lock = threading.Lock()
+        # Catalog.load already replayed a leftover journal; fold it in at the next flush
+        self.pending = bool(self.journal_path and os.path.exists(self.journal_path))
+        atexit.register(self.flush)
+
+    def save(self):
+        with self.lock:
+            changes = self.catalog.mark_clean()
+            if not changes:
+                return
+            self.pending = True
+            if self.journal_path is None or any(change["op"] == "reset" for change in changes):
+                self.write_locked()
+                return
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for change in changes:
+                    f.write(json.dumps(change) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            if size > JOURNAL_MAX_BYTES:
+                self.write_locked()
+
+    def flush(self):
+        # Make apps.json complete on its own (called on exit), including edits save() hasn't seen yet
+        with self.lock:
+            if self.catalog.mark_clean() or self.pending:
+                self.write_locked()
+
+    def write(self, text=None):
+        # Full write of text (apps.json content as a string) or of the current catalog
+        with self.lock:
+            self.catalog.mark_clean()
+            self.write_locked(text)
+
+    def write_locked(self, text=None):
+        if text is None:
+            text = json.dumps(self.catalog.to_json(), indent=2)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # Only once apps.json holds every edit; a crash before this just replays them again
+        if self.journal_path and os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.pending = False
+
+INSTALLER_OK_CODES = (0, 1641, 3010)  # success, and success with a reboot started / required
+MSIEXEC = os.path.join(os.environ.get("SystemRoot", r"C:\Windows"), "System32", "msiexec.exe")
+
+def run_as_admin(exe, params='', wait=False):
     # exe: path to the executable
     # params: command line arguments as a single string or None
+    # wait: block until the process exits and return its exit code (otherwise returns None)
+    import ctypes
     print(f"Running as admin: {exe}")
-    ctypes.windll.shell32.ShellExecuteW(None, "runas", exe, params, None, 1)
+    if not wait:
+        ctypes.windll.shell32.ShellExecuteW(None, "runas", exe, params, None, 1)
+        return None
+    from ctypes import wintypes
+
+    class SHELLEXECUTEINFOW(ctypes.Structure):
+        _fields_ = [("cbSize", wintypes.DWORD), ("fMask", wintypes.ULONG), ("hwnd", wintypes.HWND),
+                    ("lpVerb", wintypes.LPCWSTR), ("lpFile", wintypes.LPCWSTR), ("lpParameters", wintypes.LPCWSTR),
+                    ("lpDirectory", wintypes.LPCWSTR), ("nShow", ctypes.c_int), ("hInstApp", wintypes.HINSTANCE),
+                    ("lpIDList", ctypes.c_void_p), ("lpClass", wintypes.LPCWSTR), ("hkeyClass", wintypes.HKEY),
+                    ("dwHotKey", wintypes.DWORD), ("hIconOrMonitor", wintypes.HANDLE), ("hProcess", wintypes.HANDLE)]
+    shell32 = ctypes.WinDLL("shell32", use_last_error=True)
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    shell32.ShellExecuteExW.argtypes = [ctypes.POINTER(SHELLEXECUTEINFOW)]
+    kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+    kernel32.GetExitCodeProcess.argtypes = [wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD)]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    # SEE_MASK_NOCLOSEPROCESS | SEE_MASK_NOASYNC: hand back the process handle once it has started
+    info = SHELLEXECUTEINFOW(cbSize=ctypes.sizeof(SHELLEXECUTEINFOW), fMask=0x40 | 0x100, lpVerb="runas",
+                             lpFile=os.path.abspath(exe), lpParameters=params or None, nShow=1)
+    if not shell32.ShellExecuteExW(ctypes.byref(info)):
+        raise ctypes.WinError(ctypes.get_last_error())  # e.g. the UAC prompt was declined
+    if not info.hProcess:
+        return 0  # handed off to an already running process, nothing to wait for
+    try:
+        kernel32.WaitForSingleObject(info.hProcess, 0xFFFFFFFF)
+        code = wintypes.DWORD()
+        kernel32.GetExitCodeProcess(info.hProcess, ctypes.byref(code))
+        return code.value
+    finally:
+        kernel32.CloseHandle(info.hProcess)
+
+def install_app(path):
+    # Run an installer and wait for it to finish; raises if it couldn't start or reported a failure.
+    # .msi packages aren't programs themselves and go through msiexec.
+    if path.lower().endswith(".msi"):
+        code = run_as_admin(MSIEXEC, f'/i "{os.path.abspath(path)}"', wait=True)
+    else:
+        code = run_as_admin(path, wait=True)
+    if code is not None and code not in INSTALLER_OK_CODES:
+        raise RuntimeError(f"installer exited with code {code}")
+    return code
+
+# Download engine settings
+DOWNLOAD_WORKERS = 6  # how many installers are fetched at the same time
+PER_HOST_CONNECTIONS = 4  # max simultaneous connections to a single host
+DOWNLOAD_TIMEOUT = (15, 60)  # (connect, read) seconds
+RETRY_ATTEMPTS = 5  # tries per download before giving up on transient errors
+RETRY_BACKOFF = 1.0  # base delay in seconds, doubled every retry (with full jitter)
+RETRY_BACKOFF_MAX = 30.0
+SEGMENT_COUNT = 4  # parallel byte ranges for one large download (1 disables segmenting)
+SEGMENT_THRESHOLD = 64 * 1024 * 1024  # only files at least this big are segmented
+SEGMENT_PIECE = 16 * 1024 * 1024  # ranges are cut into pieces this big and fetched in file order
+TRANSFER_CHUNK_MIN = 64 * 1024  # first read size of every response body
+TRANSFER_CHUNK_MAX = 4 * 1024 * 1024  # reads grow up to this while the link keeps the buffer full
+TRANSFER_READ_TARGET = 0.05  # seconds per read to aim for, so progress keeps moving on slow links
+PART_INFO_BYTES = 32 * 1024 * 1024  # how often a preallocated .part records its progress
+DOWNLOAD_ORDER = "smallest"  # "smallest" starts the smallest installers first, "listed" keeps the order given
+BANDWIDTH_LIMIT = 0  # bytes/sec shared by all downloads, 0 for no limit
+BANDWIDTH_CHUNK_MIN = 16 * 1024  # smallest read size while a bandwidth limit is set
+SIZE_PROBE_WORKERS = 8  # HEAD requests in flight while sizing a batch
+SIZE_PROBE_TIMEOUT = (5, 10)
+SIZE_PROBE_WAIT = 1.5  # longest a free worker waits for sizes before starting whatever is queued
+DOWNLOAD_ORDERS = {"smallest": "Smallest first", "listed": "In list order"}
+MIRROR_STATS = "mirrors.json"  # per-host speed and failures, so the best mirror is tried first next time
+MIRROR_RACE = 3  # how many mirrors race a probe before a download starts
+MIRROR_PROBE_BYTES = 64 * 1024  # size of that probe (a ranged GET)
+MIRROR_COOLDOWN = 15 * 60  # seconds a mirror that just failed goes to the back of the line
+METADATA_CACHE = "url_metadata.json"  # where each download URL redirects to, its size, type and file name
+METADATA_TTL = 60 * 60  # seconds a download goes straight to where its URL redirected last time
+INSTALLER_EXTENSIONS = (".exe", ".msi", ".zip", ".msix", ".msixbundle", ".appx", ".appxbundle")
+CONTENT_TYPE_EXTENSIONS = {"application/x-msi": ".msi", "application/x-ole-storage": ".msi", "application/zip": ".zip",
+                           "application/x-zip-compressed": ".zip", "application/msix": ".msix", "application/x-msdownload": ".exe"}
+PROGRESS_INTERVAL = 0.1  # seconds between progress reports for one download
+EVENT_POLL_MS = 30  # how often the Tk loop drains download events
+EVENT_BUDGET = 0.010  # max seconds spent draining events per poll
+
+class ProgressMeter:
+    # Counts received bytes and reports (done, total, rate, eta) at most every PROGRESS_INTERVAL.
+    # rate is a smoothed bytes/sec, eta is seconds left (None when the size is unknown).
+    def __init__(self, total, callback=None, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.callback = callback
+        self.interval = interval
+        self.done = 0
+        self.rate = 0.0
+        self.window_time = time.monotonic()
+        self.window_done = 0
+        self.lock = threading.Lock()  # segmented downloads update from several threads
+
+    def update(self, n):
+        with self.lock:
+            self.done += n
+            now = time.monotonic()
+            if now - self.window_time < self.interval:
+                return
+            current = (self.done - self.window_done) / (now - self.window_time)
+            self.rate = current if not self.rate else 0.7 * self.rate + 0.3 * current
+            self.window_time = now
+            self.window_done = self.done
+        self.report()
+
+    def eta(self):
+        if not self.total or not self.rate:
+            return None
+        return max(0.0, (self.total - self.done) / self.rate)
+
+    def report(self):
+        if self.callback:
+            self.callback(self.done, self.total, self.rate, self.eta())
+
+    def restart(self, done, total):
+        # Called when a (re)connection starts; done counts bytes already on disk
+        self.done = self.window_done = done
+        self.total = total
+        self.window_time = time.monotonic()
+
+    def finish(self):
+        if not self.total:
+            self.total = self.done
+        self.report()
+
+class BandwidthLimiter:
+    # Shares one bytes/sec budget between all transfers of an engine. Every read books its
+    # bytes' worth of link time after the reads already booked and sleeps until that slot is
+    # over; a transfer books one read at a time and all of them read the same amount (chunk),
+    # so active transfers take turns and each gets an equal share. rate 0 means no limit and
+    # can be changed while downloads are running.
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_free = time.monotonic()
+
+    def chunk(self):
+        # Read size to use under the limit, or None without one
+        rate = self.rate
+        if not rate:
+            return None
+        return int(min(TRANSFER_CHUNK_MAX, max(BANDWIDTH_CHUNK_MIN, rate * TRANSFER_READ_TARGET)))
+
+    def consume(self, n):
+        # Wait until n bytes just read fit under the limit; returns the seconds slept
+        rate = self.rate
+        if not rate:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.next_free = max(now, self.next_free) + n / rate
+            delay = self.next_free - now
+        time.sleep(delay)
+        return delay
+
+# Telemetry settings
+TELEMETRY_LOG = "install_log.jsonl"  # one JSON object per app and run
+PROMETHEUS_TEXTFILE = None  # path for a node_exporter textfile with the last run's numbers, or None
+PHASES = ("queue", "dns", "redirects", "ttfb", "transfer", "disk", "hash", "extract", "install")
+
+class PhaseTrace:
+    # Where the time went for one app. queue is the wait for a free download worker, dns is a lookup of the host the first time the engine
+    # talks to it, redirects and ttfb come from requests' elapsed times, transfer is time spent
+    # waiting on the socket, disk is time spent in file writes and hash is hashing that the
+    # download had to wait for; extract is unpacking a zip-packaged installer (see unpack_installer).
+    # Segmented downloads add up all of their connections, so those
+    # phases can exceed the wall time in download_s. ready_s and finished_s count from the
+    # start of the run (run_started). Safe to update from several threads.
+    def __init__(self, app, url, run=None, run_started=None):
+        self.lock = threading.Lock()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.started = time.perf_counter()
+        self.run_started = run_started or self.started
+        self.download_started = None
+        self.record = {"run": run, "app": app, "url": url, "final_url": None, "redirects": 0, "attempts": 0,
+                       "bytes": 0, "status": None, "error": None, "started": time.time()}
+
+    def add(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] += seconds
+
+    def add_io(self, transfer, disk, hashing, transferred):
+        # Totals of one copy_body call
+        with self.lock:
+            self.phases["transfer"] += transfer
+            self.phases["disk"] += disk
+            self.phases["hash"] += hashing
+            self.record["bytes"] += transferred
+
+    def attempt(self):
+        with self.lock:
+            if self.download_started is None:
+                self.download_started = time.perf_counter()
+                self.phases["queue"] += self.download_started - self.started
+            self.record["attempts"] += 1
+
+    def phase(self, name):
+        # with trace.phase("install"): ...
+        import contextlib
+        @contextlib.contextmanager
+        def timed():
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.add(name, time.perf_counter() - started)
+        return timed()
+
+    def response(self, r):
+        # Redirect hops and time to first byte of a response that is about to be read
+        self.add("redirects", sum(h.elapsed.total_seconds() for h in r.history))
+        self.add("ttfb", r.elapsed.total_seconds())
+        with self.lock:
+            self.record["redirects"] += len(r.history)
+            self.record["final_url"] = r.url
+
+    def downloaded(self, status, error=None):
+        # status: "ok", "cached" (304 Not Modified), "shared" (bytes from another download) or "failed"
+        with self.lock:
+            if self.record["status"] != "cached":
+                self.record["status"] = status
+            self.record["error"] = error
+            now = time.perf_counter()
+            self.record["download_s"] = round(now - (self.download_started or self.started), 4)
+            if status != "failed":
+                self.record["ready_s"] = round(now - self.run_started, 4)  # installer on disk
+
+    def finish(self, status=None, error=None):
+        with self.lock:
+            if status:
+                self.record["status"] = status
+            if error:
+                self.record["error"] = error
+            record = dict(self.record)
+            record["phases"] = {name: round(seconds, 4) for name, seconds in self.phases.items()}
+        now = time.perf_counter()
+        record["total_s"] = round(now - self.started, 4)
+        record["finished_s"] = round(now - self.run_started, 4)
+        download_s = record.get("download_s") or 0
+        record["throughput"] = round(record["bytes"] / download_s) if download_s else None
+        return record
+
+class Telemetry:
+    # Collects finished PhaseTraces: each one is appended to the JSONL log, kept in self.last_run
+    # for the GUI summary and, when prometheus_path is set, the whole run is rewritten as a
+    # node_exporter textfile (atomically, as the textfile collector expects).
+    def __init__(self, log_path=TELEMETRY_LOG, prometheus_path=PROMETHEUS_TEXTFILE):
+        self.log_path = log_path
+        self.prometheus_path = prometheus_path
+        self.lock = threading.Lock()
+        self.run = None
+        self.run_started = None
+        self.last_run = []  # finished records of the current (or latest) run
+
+    def begin_run(self):
+        with self.lock:
+            self.run = time.strftime("%Y%m%dT%H%M%S")
+            self.run_started = time.perf_counter()
+            self.last_run = []
+
+    def start(self, app, url):
+        return PhaseTrace(app, url, run=self.run, run_started=self.run_started)
+
+    def finish(self, trace, status=None, error=None):
+        record = trace.finish(status, error)
+        with self.lock:
+            self.last_run.append(record)
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+                if self.prometheus_path:
+                    self.write_prometheus()
+            except OSError as e:
+                print(f"Could not write telemetry: {e}")
+        return record
+
+    def write_prometheus(self):
+        # Caller holds the lock
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+        lines = [
+            "# HELP bores_install_phase_seconds Seconds spent in each phase of the last run, per app.",
+            "# TYPE bores_install_phase_seconds gauge",
+        ]
+        for record in self.last_run:
+            for phase, seconds in record["phases"].items():
+                lines.append(f'bores_install_phase_seconds{{app="{label(record["app"])}",phase="{phase}"}} {seconds}')
+        lines += ["# HELP bores_install_bytes Bytes downloaded in the last run, per app.", "# TYPE bores_install_bytes gauge"]
+        lines += [f'bores_install_bytes{{app="{label(r["app"])}"}} {r["bytes"]}' for r in self.last_run]
+        lines += ["# HELP bores_install_success 1 if the app was installed or downloaded without errors.", "# TYPE bores_install_success gauge"]
+        lines += [f'bores_install_success{{app="{label(r["app"])}"}} {int(r["status"] != "failed")}' for r in self.last_run]
+        first_ready, makespan = run_times(self.last_run)
+        if first_ready is not None:
+            lines += ["# HELP bores_install_first_ready_seconds Seconds from the start of the last run until the first installer was downloaded.",
+                      "# TYPE bores_install_first_ready_seconds gauge", f"bores_install_first_ready_seconds {first_ready}"]
+        lines += ["# HELP bores_install_makespan_seconds Seconds from the start of the last run until its last app finished.",
+                  "# TYPE bores_install_makespan_seconds gauge", f"bores_install_makespan_seconds {makespan}"]
+        lines += ["# HELP bores_install_last_run_timestamp_seconds When the last app of the run finished.",
+                  "# TYPE bores_install_last_run_timestamp_seconds gauge",
+                  f"bores_install_last_run_timestamp_seconds {time.time():.0f}"]
+        tmp_path = self.prometheus_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+def run_times(records):
+    # (seconds until the first installer was ready or None, seconds until the last app finished)
+    ready = [r["ready_s"] for r in records if r.get("ready_s") is not None]
+    return (min(ready) if ready else None), max((r["finished_s"] for r in records), default=0.0)
+
+def summarize_run(records, limit=5):
+    # A few lines for the "Last Run" panel: totals, then the slowest apps and their biggest phases
+    if not records:
+        return "No installs yet."
+    failed = sum(r["status"] == "failed" for r in records)
+    total_bytes = sum(r["bytes"] for r in records)
+    first_ready, makespan = run_times(records)
+    ready = f"first ready {first_ready:.1f}s, " if first_ready is not None else ""
+    lines = [f"{len(records)} app(s), {format_size(total_bytes)}, {failed} failed, {ready}all done {makespan:.1f}s"]
+    for record in sorted(records, key=lambda r: r["total_s"], reverse=True)[:limit]:
+        top = sorted(((s, p) for p, s in record["phases"].items() if s >= 0.05), reverse=True)[:3]
+        where = ", ".join(f"{phase} {seconds:.1f}s" for seconds, phase in top) or "-"
+        lines.append(f"{record['app']}: {record['total_s']:.1f}s ({where}){' FAILED' if record['status'] == 'failed' else ''}")
+    return "\n".join(lines)
+
+# Installer cache settings
+CACHE_INDEX = "installers_cache.json"  # lives next to the installers/ folder
+CACHE_MAX_BYTES = 20 * 1024 ** 3  # evict least recently used installers beyond this
+
+def cache_index_path(directory):
+    # The InstallerCache index for an installer folder, kept next to it like CACHE_INDEX is
+    # for installers/, so the CLI's --dir folders each have their own
+    return os.path.normpath(directory) + "_cache.json"
+
+class InstallerCache:
+    # Remembers what was downloaded for each app (validators, final URL, size, SHA-256)
+    # so later runs can revalidate with If-None-Match / If-Modified-Since and skip the body on a 304.
+    # Installers are evicted least-recently-used first once the folder grows past max_bytes.
+    def __init__(self, index_path=CACHE_INDEX, max_bytes=CACHE_MAX_BYTES):
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = {}  # app_name: entry dict
+        try:
+            with open(index_path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def lookup(self, key, url, path):
+        # Returns the cached entry if it still describes the file on disk, else None
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or entry.get("url") != url or entry.get("path") != path:
+                return None
+            try:
+                if os.path.getsize(path) != entry.get("size"):
+                    return None
+            except OSError:
+                return None
+            return dict(entry)
+
+    def final_url(self, key, url):
+        # Where key's last download of url was redirected to, if known
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry.get("final_url") if entry and entry.get("url") == url else None
+
+    def known_size(self, key, url):
+        # Size of the last download of key from url, if any
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry.get("size") if entry and entry.get("url") == url else None
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries[key]["last_used"] = time.time()
+                self.save()
+
+    def store(self, key, url, path, final_url, etag, last_modified, content_length, size, sha256):
+        with self.lock:
+            self.entries[key] = {
+                "url": url,
+                "path": path,
+                "final_url": final_url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_length": content_length or None,
+                "size": size,
+                "sha256": sha256,
+                "last_used": time.time(),
+            }
+            self.evict(keep=key)
+            self.save()
+
+    def forget(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.save()
+
+    def evict(self, keep=None):
+        # Caller holds the lock. Apps sharing one installer in the store count its size once,
+        # and it only stops counting when the last of them is evicted.
+        def content(entry):
+            return entry.get("sha256") or entry["path"]
+        sizes = {content(e): e.get("size") or 0 for e in self.entries.values()}
+        total = sum(sizes.values())
+        directories = set()
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+            unpacked = os.path.splitext(entry["path"])[0]
+            if os.path.exists(os.path.join(unpacked, ARCHIVE_MARKER)):
+                import shutil
+                shutil.rmtree(unpacked, ignore_errors=True)  # what unpack_installer extracted from it
+            del self.entries[key]
+            if not any(content(e) == content(entry) for e in self.entries.values()):
+                total -= sizes[content(entry)]
+            directories.add(os.path.dirname(entry["path"]))
+            print(f"Evicted cached installer: {key}")
+        for directory in directories:
+            prune_store(directory)
+
+    def save(self):
+        # Caller holds the lock. Write to a temp file and swap so a crash can't truncate the index.
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+class MirrorStats:
+    # What each mirror host has been like: smoothed download speed, probe latency and recent
+    # failures, kept in path (mirrors.json) across runs so the best mirror is tried first.
+    # path None keeps the numbers in memory only.
+    def __init__(self, path=MIRROR_STATS):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hosts = {}  # host: {"rate", "latency", "ok", "failures", "last_failure"}
+        if path:
+            try:
+                with open(path, "r") as f:
+                    self.hosts = json.load(f)
+            except (OSError, ValueError):
+                self.hosts = {}
+
+    def host(self, url):
+        # Caller holds the lock
+        return self.hosts.setdefault(urlsplit(url).netloc.lower(), {"rate": None, "latency": None, "ok": 0, "failures": 0, "last_failure": 0})
+
+    def cooling(self, url):
+        stats = self.hosts.get(urlsplit(url).netloc.lower())
+        return bool(stats and stats["failures"] and time.time() - stats["last_failure"] < MIRROR_COOLDOWN)
+
+    def rank(self, urls):
+        # Healthy mirrors first, fastest known download speed first among them; mirrors without
+        # numbers yet keep their apps.json order after the ones known to be fast
+        def order(item):
+            index, url = item
+            stats = self.hosts.get(urlsplit(url).netloc.lower()) or {}
+            return (self.cooling(url), -(stats.get("rate") or 0), index)
+        return [url for index, url in sorted(enumerate(urls), key=order)]
+
+    def probed(self, url, seconds):
+        with self.lock:
+            stats = self.host(url)
+            stats["latency"] = seconds if stats["latency"] is None else 0.7 * stats["latency"] + 0.3 * seconds
+            self.save()
+
+    def downloaded(self, url, size, seconds):
+        with self.lock:
+            stats = self.host(url)
+            stats["ok"] += 1
+            stats["failures"] = 0
+            if size >= MIRROR_PROBE_BYTES and seconds > 0:
+                rate = size / seconds
+                stats["rate"] = rate if stats["rate"] is None else 0.7 * stats["rate"] + 0.3 * rate
+            self.save()
+
+    def failed(self, url):
+        with self.lock:
+            stats = self.host(url)
+            stats["failures"] += 1
+            stats["last_failure"] = time.time()
+            self.save()
+
+    def save(self):
+        # Caller holds the lock
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.hosts, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save mirror stats: {e}")
+
+class MetadataCache:
+    # What each download URL looked like the last time it was resolved: where its redirects
+    # ended (final_url), its size, content type and file name, kept in path (url_metadata.json)
+    # across runs. Downloads only go straight to final_url while the entry is younger than ttl;
+    # older entries still give the grid a size and the scheduler an order.
+    # path None keeps it in memory only.
+    def __init__(self, path=METADATA_CACHE, ttl=METADATA_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}  # url: {"final_url", "size", "content_type", "filename", "resolved"}
+        if path:
+            try:
+                with open(path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            return dict(entry) if entry else None
+
+    def fresh(self, url):
+        entry = self.get(url)
+        return entry if entry and time.time() - entry["resolved"] < self.ttl else None
+
+    def final_url(self, url):
+        entry = self.fresh(url)
+        return entry["final_url"] if entry else None
+
+    def size(self, url):
+        entry = self.get(url)
+        return entry["size"] if entry else None
+
+    def store(self, url, final_url, size, content_type, filename):
+        with self.lock:
+            self.entries[url] = {"final_url": final_url, "size": size, "content_type": content_type, "filename": filename, "resolved": time.time()}
+            self.save()
+
+    def forget(self, url):
+        with self.lock:
+            if self.entries.pop(url, None) is not None:
+                self.save()
+
+    def save(self):
+        # Caller holds the lock
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save URL metadata: {e}")
+
+class DownloadEngine:
+    # Fetches installers in parallel over one pooled requests.Session.
+    # Every host gets its own semaphore so a big selection from the same CDN
+    # doesn't open more than PER_HOST_CONNECTIONS sockets to it.
+    # Work runs on a background thread pool; results come back through callbacks
+    # (see submit) so the Tk mainloop never blocks on the network.
+    # Queued downloads wait in self.pending and a free worker takes the next one by priority
+    # and then, with order "smallest", by size: known from apps.json or the installer cache, or
+    # looked up with a HEAD request (see inspect), so small tools are ready before the big SDKs are.
+    # inspect also remembers where a URL redirects to in metadata (a MetadataCache), and while
+    # that is fresh the download goes straight there over the connection the lookup left open.
+    # bandwidth caps all transfers together (bytes/sec, see BandwidthLimiter).
+    # Finished installers are kept once per SHA-256 in a store next to them (see store_installer)
+    # and downloads of the same resolved URL that overlap share a single transfer (see fetch).
+    # A URL can also be a list of mirrors (see mirror_list); mirrors is the MirrorStats used to rank them.
+    # peers are other instances' PeerServers (base URLs) tried before the origin; discover adds
+    # the ones that answer a LAN broadcast, for installers apps.json has a sha256 for.
+    def __init__(self, workers=DOWNLOAD_WORKERS, per_host=PER_HOST_CONNECTIONS, cache=None, segments=SEGMENT_COUNT, segment_threshold=SEGMENT_THRESHOLD,
+                 order=DOWNLOAD_ORDER, bandwidth=BANDWIDTH_LIMIT, mirrors=None, peers=None, discover=False, metadata=None):
+        self.workers = max(1, int(workers))
+        self.per_host = max(1, int(per_host))
+        self.segments = max(1, int(segments))
+        self.segment_threshold = segment_threshold
+        self.cache = cache  # optional InstallerCache
+        self.mirrors = mirrors or MirrorStats(None)
+        self.metadata = metadata or MetadataCache(None)
+        load_requests()
+        self.session = requests.Session()
+        # One connection pool per host, with room for every host inspect warms up ahead of the downloads
+        adapter = requests.adapters.HTTPAdapter(pool_connections=64, pool_maxsize=max(self.workers, self.per_host))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Installers are already compressed; identity encoding keeps byte offsets valid for Range resumes
+        self.session.headers["Accept-Encoding"] = "identity"
+        self.host_limits = {}  # host: BoundedSemaphore
+        self.resolved = set()  # hosts whose DNS lookup was already timed
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download")
+        self.order = order
+        self.limiter = BandwidthLimiter(bandwidth)
+        self.pending = []  # queued jobs: {"run", "future", "priority", "size", "probing", "queued", "seq"}
+        self.ready = threading.Condition(self.lock)  # notified when a size probe finishes
+        self.sequence = 0
+        self.probe_pool = None  # created on the first HEAD request
+        self.inspections = {}  # url: Future of its inspect, so a URL is looked up once at a time
+        self.inspect_lock = threading.Lock()
+        self.final_urls = {}  # url: where its redirects last ended up
+        self.flights = {}  # resolved url: {"done", "record", "error"} of the download in progress
+        self.peers = list(peers or [])
+        self.discover = discover
+        self.discovered = (0, [])  # (when, base urls)
+        self.peer_lock = threading.Lock()
+        self.peer_indexes = {}  # base url: (when, installers it listed)
+
+    def host_slot(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            slot = self.host_limits.get(host)
+            if slot is None:
+                slot = self.host_limits[host] = threading.BoundedSemaphore(self.per_host)
+        return slot
+
+    def schedule(self, run, url, key=None, size=None, priority=0):
+        # Queue run() for the next free worker and return a Future for its result. Without a
+        # URL there is nothing to size; run() (fetch) reports that as the job's error.
+        url = (mirror_list(url) or [None])[0]
+        job = {"run": run, "future": Future(), "priority": priority, "size": size, "probing": False, "queued": time.monotonic()}
+        if job["size"] is None and url and self.cache and key:
+            job["size"] = self.cache.known_size(key, url)
+        if job["size"] is None and url:
+            job["size"] = self.metadata.size(url)
+        if job["size"] is None and url and self.order == "smallest":
+            job["probing"] = True
+            self.probe_size(job, url)
+        with self.ready:
+            job["seq"] = self.sequence
+            self.sequence += 1
+            self.pending.append(job)
+        self.pool.submit(self.run_next)
+        return job["future"]
+
+    def probe_size(self, job, url):
+        # Look the URL up in the background (see inspect) and file its size under job["size"]
+        def probed(future):
+            info = None if future.cancelled() else future.result()
+            with self.ready:
+                job["size"] = info and info["size"]  # unknown sizes go after the known ones
+                job["probing"] = False
+                self.ready.notify_all()
+        self.prefetch(url).add_done_callback(probed)
+
+    def prefetch(self, url):
+        # inspect url on the probe threads; returns a Future of its metadata (or None)
+        mirrors = mirror_list(url)
+        if not mirrors:
+            future = Future()
+            future.set_result(None)
+            return future
+        url = mirrors[0]
+        with self.inspect_lock:
+            future = self.inspections.get(url)
+            if future is None or future.done():
+                future = self.inspections[url] = self.probe(self.inspect, url)
+        return future
+
+    def inspect(self, url):
+        # Follow url's redirects and note where they end, the size, content type and file name
+        # in self.metadata. Uses HEAD, or a one byte ranged GET for servers that won't answer
+        # HEAD. The connection to the final host goes back to the session's pool, so a download
+        # starting soon after skips both the redirects and the TCP/TLS handshakes.
+        # Returns the metadata entry, or None if url couldn't be reached.
+        info = self.metadata.fresh(url)
+        if info:
+            return info
+        try:
+            r = self.session.head(url, allow_redirects=True, timeout=SIZE_PROBE_TIMEOUT)
+            if r.status_code >= 400:
+                r.close()
+                r = self.session.get(url, stream=True, timeout=SIZE_PROBE_TIMEOUT, headers={"Range": "bytes=0-0"})
+            with r:
+                if r.status_code >= 400:
+                    return None
+                if r.status_code == 206:
+                    size = parse_content_range(r.headers.get("Content-Range"))[1]
+                    r.content  # the one byte, so the connection can be reused
+                else:
+                    size = int(r.headers.get("Content-Length") or 0) or None
+        except (requests.RequestException, ValueError):
+            return None
+        self.final_urls[url] = r.url
+        self.metadata.store(url, r.url, size, r.headers.get("Content-Type"), content_filename(r))
+        return self.metadata.get(url)
+
+    def get(self, url, headers):
+        # Streamed GET of url. While its redirects are known (see inspect) the request goes
+        # straight to where they ended; if that stopped working (signed links expire, "latest"
+        # links move on) the entry is dropped and url itself is asked.
+        target = self.metadata.final_url(url)
+        if target and target != url:
+            try:
+                r = self.session.get(target, stream=True, timeout=DOWNLOAD_TIMEOUT, headers=headers)
+                if r.status_code < 400:
+                    return r
+                r.close()
+            except requests.ConnectionError:
+                pass
+            self.metadata.forget(url)
+        return self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT, headers=headers)
+
+    def probe(self, fn, *args):
+        # Run a small request on the probe threads, away from the download workers
+        with self.lock:
+            if self.probe_pool is None:
+                self.probe_pool = ThreadPoolExecutor(max_workers=SIZE_PROBE_WORKERS, thread_name_prefix="probe")
+        return self.probe_pool.submit(fn, *args)
+
+    def rank_mirrors(self, urls):
+        # Best mirror first: the healthy ones by remembered speed, and among the top MIRROR_RACE
+        # the one that answers a MIRROR_PROBE_BYTES ranged GET first. Slower probes still finish
+        # in the background and feed the stats.
+        ranked = self.mirrors.rank(urls)
+        contenders = [url for url in ranked[:MIRROR_RACE] if not self.mirrors.cooling(url)]
+        if len(contenders) < 2:
+            return ranked
+        futures = {self.probe(self.probe_mirror, url): url for url in contenders}
+        try:
+            for future in as_completed(futures, timeout=sum(SIZE_PROBE_TIMEOUT)):
+                if future.result():
+                    winner = futures[future]
+                    return [winner] + [url for url in ranked if url != winner]
+        except FuturesTimeoutError:
+            pass
+        return ranked
+
+    def probe_mirror(self, url):
+        started = time.perf_counter()
+        try:
+            with self.session.get(url, stream=True, timeout=SIZE_PROBE_TIMEOUT, headers={"Range": f"bytes=0-{MIRROR_PROBE_BYTES - 1}"}) as r:
+                if r.status_code not in (200, 206):
+                    self.mirrors.failed(url)
+                    return False
+                r.raw.read(MIRROR_PROBE_BYTES)
+                self.final_urls[url] = r.url
+        except (requests.RequestException, OSError):
+            self.mirrors.failed(url)
+            return False
+        self.mirrors.probed(url, time.perf_counter() - started)
+        return True
+
+    def job_order(self, job):
+        if self.order == "smallest":
+            return (-job["priority"], job["size"] if job["size"] is not None else float("inf"), job["seq"])
+        return (-job["priority"], job["seq"])
+
+    def run_next(self):
+        # Runs on a pool worker: pick the best queued job, giving size probes that could still
+        # come out ahead up to SIZE_PROBE_WAIT after they were queued to come back first
+        with self.ready:
+            while True:
+                now = time.monotonic()
+                probing = [job for job in self.pending if job["probing"] and now - job["queued"] < SIZE_PROBE_WAIT]
+                known = [job for job in self.pending if job not in probing]
+                best = min(known, key=self.job_order) if known else None
+                if not probing or (best and all(job["priority"] < best["priority"] for job in probing)):
+                    break
+                self.ready.wait(SIZE_PROBE_WAIT - (now - min(job["queued"] for job in probing)))
+            if not self.pending:
+                return
+            job = min(self.pending, key=self.job_order)
+            self.pending.remove(job)
+        if not job["future"].set_running_or_notify_cancel():
+            return
+        try:
+            job["future"].set_result(job["run"]())
+        except Exception as e:
+            job["future"].set_exception(e)
+
+    def resolve(self, url, trace):
+        # Time a DNS lookup of the host the first time it is used; after that the
+        # connection pool and the resolver cache make lookups (nearly) free
+        parts = urlsplit(url)
+        with self.lock:
+            if parts.hostname in self.resolved:
+                return
+            self.resolved.add(parts.hostname)
+        import socket
+        started = time.perf_counter()
+        try:
+            socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        except OSError:
+            pass  # the request itself will report it
+        trace.add("dns", time.perf_counter() - started)
+
+    def fetch(self, url, path, progress=None, key=None, sha256=None, size=None, trace=None):
+        # progress: optional callable(done, total, rate, eta), called from this worker thread
+        # key: cache key (the app name); when set and the engine has a cache, the download
+        # is revalidated against the cached copy and skipped on 304 Not Modified
+        # sha256, size: expected hash and length (see expected_checks); they are checked while
+        # the data streams in and a mismatch raises IntegrityError without the file reaching path.
+        # trace: optional PhaseTrace that gets the download's timings.
+        # Data goes to path + ".part" and is moved into the store when complete, so an interrupted
+        # transfer resumes from where it stopped instead of starting over.
+        # A fetch of a URL that resolves to one already being downloaded waits for that transfer
+        # and links its result instead of downloading the same bytes again; either way path is returned.
+        # url can be a list of mirrors: the download starts on the best one (see rank_mirrors)
+        # and moves to the next when one fails, keeping the bytes it already has. The first
+        # mirror's URL identifies the download in the cache, the .part sidecar and traces.
+        mirrors = mirror_list(url)
+        if not mirrors:
+            raise ValueError("no download URL")
+        url = mirrors[0]
+        flight_key = self.final_urls.get(url) or self.metadata.final_url(url) or (self.cache.final_url(key, url) if self.cache and key else None) or url
+        with self.lock:
+            flight = self.flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[flight_key] = {"done": threading.Event(), "record": None, "error": None}
+        if not leader:
+            print(f"Waiting for the download of {url} already in progress")
+            if trace:
+                trace.attempt()
+            flight["done"].wait()
+            if flight["error"] is not None:
+                if trace:
+                    trace.downloaded("failed", str(flight["error"]))
+                raise flight["error"]
+            self.share(flight["record"], url, path, progress, key, sha256, size, trace)
+            return path
+        try:
+            flight["record"] = self.fetch_leader(url, path, progress, key, sha256, size, trace, mirrors)
+            return path
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[flight_key]
+            flight["done"].set()
+
+    def fetch_leader(self, url, path, progress, key, sha256, size, trace, mirrors):
+        # fetch for the one caller actually downloading url; returns the record of what landed at path
+        stored = sha256 and store_object(path, sha256)
+        if stored and os.path.exists(stored):
+            # Another app (or an earlier run) already brought in exactly these bytes
+            return self.share({"path": stored, "sha256": sha256, "size": os.path.getsize(stored), "final_url": None}, url, path, progress, key, sha256, size, trace)
+        cached = self.cache.lookup(key, url, path) if self.cache and key else None
+        if cached and sha256 and cached.get("sha256") != sha256:
+            cached = None  # the copy on disk isn't the build apps.json asks for
+        checks = (sha256, size)
+        meter = ProgressMeter(0, progress)
+        if not cached and (self.peers or (self.discover and sha256)):
+            record = self.fetch_from_peers(url, path, meter, key, sha256, size, trace)
+            if record:
+                if trace:
+                    trace.downloaded("ok")
+                return record
+        sources = self.rank_mirrors(mirrors) if len(mirrors) > 1 else list(mirrors)
+        attempts = dict.fromkeys(sources, 0)
+        current = 0
+        while True:
+            source = sources[current]
+            before = meter.done
+            started = time.perf_counter()
+            if trace:
+                trace.attempt()
+            try:
+                record = self.fetch_once(url, path, meter, key, cached, checks, trace, source)
+                if len(mirrors) > 1:
+                    self.mirrors.downloaded(source, meter.done - before, time.perf_counter() - started)
+                if trace:
+                    trace.downloaded("ok")
+                return record
+            except Exception as e:
+                if len(mirrors) > 1:
+                    self.mirrors.failed(source)
+                # An attempt that moved the download forward doesn't count against the limit
+                attempts[source] = 1 if meter.done > before else attempts[source] + 1
+                if attempts[source] >= RETRY_ATTEMPTS or not is_transient(e):
+                    sources.remove(source)  # this mirror is out (4xx, failed verification, too many errors)
+                    if not sources:
+                        if trace:
+                            trace.downloaded("failed", str(e))
+                        raise
+                    current %= len(sources)
+                    print(f"Mirror {source} failed ({e}), switching to {sources[current]}")
+                    continue
+                current = (current + 1) % len(sources)
+                if current:
+                    print(f"Mirror {source} failed ({e}), switching to {sources[current]}")
+                    continue
+                # Every mirror failed this round; back off before going around again
+                delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempts[source]))
+                print(f"Retrying {url} in {delay:.1f}s ({e})")
+                time.sleep(delay)
+
+    def peer_list(self, sha256):
+        # Configured peers are trusted to list the right hash for a URL. Anyone on the LAN can
+        # answer discovery, so discovered peers are only asked for installers apps.json pins.
+        if self.discover and sha256:
+            with self.peer_lock:
+                when, found = self.discovered
+                if time.monotonic() - when > PEER_DISCOVERY_TTL:
+                    found = discover_peers()
+                    self.discovered = (time.monotonic(), found)
+            return self.peers + [peer for peer in found if peer not in self.peers]
+        return self.peers
+
+    def peer_entry(self, peer, url, sha256):
+        # What peer has for url, or for sha256 when that is known; None if it doesn't have it
+        when, installers = self.peer_indexes.get(peer, (0, []))
+        if time.monotonic() - when > PEER_INDEX_TTL:
+            with self.session.get(f"{peer}/index.json", timeout=SIZE_PROBE_TIMEOUT) as r:
+                r.raise_for_status()
+                installers = r.json()["installers"]
+            self.peer_indexes[peer] = (time.monotonic(), installers)
+        for entry in installers:
+            if (entry["sha256"] == sha256) if sha256 else (entry["url"] == url):
+                return entry
+        return None
+
+    def fetch_from_peers(self, url, path, meter, key, sha256, size, trace):
+        # Try to get url from a peer instead of the origin; returns the record, or None to go
+        # to the origin. The bytes are checked against apps.json's sha256 when there is one
+        # and against the hash the peer listed otherwise (configured peers only, see peer_list).
+        for peer in self.peer_list(sha256):
+            try:
+                entry = self.peer_entry(peer, url, sha256)
+            except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+                print(f"Peer {peer} unavailable ({e})")
+                continue
+            if not entry:
+                continue
+            if trace:
+                trace.attempt()
+            try:
+                record = self.fetch_once(url, path, meter, key, None, (entry["sha256"], size), trace, f"{peer}/sha256/{entry['sha256']}")
+            except Exception as e:
+                print(f"Peer {peer} failed for {url} ({e}), trying elsewhere")
+                continue
+            print(f"Downloaded {url} from peer {peer}")
+            # Keep the origin's validators, so the next run can still revalidate against it
+            record.update(final_url=entry.get("final_url"), etag=entry.get("etag"), last_modified=entry.get("last_modified"),
+                          content_length=entry.get("content_length"))
+            if self.cache and key:
+                self.cache.store(key, url, path, record["final_url"], record["etag"], record["last_modified"], entry.get("content_length"), record["size"], record["sha256"])
+            return record
+        return None
+
+    def fetch_once(self, url, path, meter, key, cached, checks=(None, None), trace=None, source=None):
+        # source: the mirror to download from (url itself by default). Bytes already in the .part
+        # are kept when resuming from another mirror, as long as it reports the same total size;
+        # validators only mean something to the mirror that sent them, so If-Range is left out.
+        source = source or url
+        part_path = path + ".part"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        offset, part_info = resume_point(url, part_path)
+        if trace:
+            self.resolve(self.metadata.final_url(source) or source, trace)
+        if part_info.get("segments"):
+            with self.host_slot(source):
+                return self.fetch_segmented(url, path, meter, key, part_info, checks=checks, trace=trace, source=source)
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = part_info.get("etag") or part_info.get("last_modified")
+            if validator and part_info.get("source", url) == source:
+                headers["If-Range"] = validator
+        elif cached:
+            headers.update(self.cache.conditional_headers(cached))
+        with self.host_slot(source):
+            with self.get(source, headers) as r:
+                if trace:
+                    trace.response(r)
+                self.final_urls[source] = r.url
+                if cached and r.status_code == 304:
+                    print(f"Using cached installer: {path}")
+                    if trace:
+                        trace.downloaded("cached")
+                    self.cache.touch(key)
+                    meter.restart(cached["size"], cached["size"])
+                    meter.finish()
+                    return cached
+                if r.status_code == 416:
+                    # Our partial file doesn't fit the resource any more; start over
+                    discard_part(part_path)
+                    raise requests.ConnectionError(f"Range not satisfiable for {url}, restarting")
+                r.raise_for_status()
+                length = int(r.headers.get("Content-Length") or 0)
+                etag = r.headers.get("ETag")
+                if etag and etag.startswith("W/"):
+                    etag = None  # weak ETags can't be used with If-Range
+                last_modified = r.headers.get("Last-Modified")
+                if offset and r.status_code == 206:
+                    start, total = parse_content_range(r.headers.get("Content-Range"))
+                    if start != offset or (total and part_info.get("total") and total != part_info["total"]):
+                        discard_part(part_path)
+                        raise requests.ConnectionError(f"Server resumed {url} at the wrong offset, restarting")
+                    total = total or (offset + length if length else 0)
+                    check_size(url, part_path, total, checks[1])
+                    print(f"Resuming {url} at {format_size(offset)}")
+                    info = part_info
+                else:
+                    # Full response: either a fresh download or the server ignored our Range
+                    offset = 0
+                    total = length
+                    discard_part(part_path)
+                    check_size(url, part_path, total, checks[1])
+                    info = {"url": url, "source": source, "final_url": r.url, "etag": etag, "last_modified": last_modified, "total": total}
+                    # Not under a bandwidth limit: extra connections would only take shares from other apps
+                    if self.segments > 1 and not self.limiter.rate and total >= self.segment_threshold and r.headers.get("Accept-Ranges", "").lower() == "bytes":
+                        return self.fetch_segmented(url, path, meter, key, info, first=r, checks=checks, trace=trace, source=source)
+                    if total:
+                        # Reserve the whole file; from now on the sidecar, not the file size, says how far we got
+                        preallocate(part_path, total)
+                        info["done"] = 0
+                    write_part_info(part_path, info)
+                meter.restart(offset, total)
+                digest = hashlib.sha256()
+                if offset:
+                    started = time.perf_counter()
+                    hash_file_prefix(part_path, offset, digest)
+                    if trace:
+                        trace.add("hash", time.perf_counter() - started)
+                tracked = "done" in info
+
+                def on_chunk(chunk):
+                    digest.update(chunk)
+                    meter.update(len(chunk))
+                    if tracked and meter.done - info["done"] >= PART_INFO_BYTES:
+                        info["done"] = meter.done
+                        write_part_info(part_path, info)
+
+                with open(part_path, "r+b" if tracked else ("ab" if offset else "wb"), buffering=0) as f:
+                    f.seek(offset)
+                    try:
+                        copy_body(r, f, on_chunk, limit=total - offset if total else None, trace=trace, limiter=self.limiter)
+                    finally:
+                        if tracked:
+                            info["done"] = meter.done
+                            write_part_info(part_path, info)
+                if total and meter.done != total:
+                    raise requests.ConnectionError(f"Connection closed after {meter.done} of {total} bytes")
+                final_url = r.url
+        check_download(url, part_path, meter.done, digest.hexdigest(), checks)
+        record = self.commit(key, url, path, final_url, etag, last_modified, total, meter.done, digest.hexdigest())
+        meter.finish()
+        return record
+
+    def fetch_segmented(self, url, path, meter, key, info, first=None, checks=(None, None), trace=None, source=None):
+        # Splits the file into byte ranges fetched in parallel and written in place into a
+        # preallocated .part file. first is an already-open 200 response, reused for range 0.
+        # Up to self.segments connections take SEGMENT_PIECE sized ranges from a queue in file
+        # order, so a FrontierHasher can hash the file right behind them.
+        # Extra connections only start if the host has free slots, otherwise ranges run one
+        # after another on this thread. Range progress is kept in the sidecar for resuming.
+        part_path = path + ".part"
+        total = info["total"]
+        if not info.get("segments") or not os.path.exists(part_path) or os.path.getsize(part_path) != total:
+            info["segments"] = split_ranges(total, max(self.segments, -(-total // SEGMENT_PIECE)))
+            preallocate(part_path, total)
+        segments = info["segments"]  # [start, end, bytes done]
+        write_part_info(part_path, info)
+        meter.restart(sum(seg[2] for seg in segments), total)
+        source = source or url
+        fetch_url = info.get("final_url") if first is not None else source
+        validator = (info.get("etag") or info.get("last_modified")) if info.get("source", url) == source else None
+        work = queue.Queue()
+        for seg in segments:
+            if seg[2] < seg[1] - seg[0]:
+                work.put(seg)
+        stop = threading.Event()
+        errors = []
+        hasher = FrontierHasher(part_path, segments)
+
+        def worker(response=None):
+            while not stop.is_set():
+                try:
+                    seg = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    self.fetch_range(fetch_url, part_path, seg, meter, validator, stop, hasher, trace, response if seg is segments[0] else None, total)
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+                response = None
+
+        slot = self.host_slot(fetch_url)
+        held = 0
+        while held < min(work.qsize(), self.segments) - 1 and slot.acquire(blocking=False):
+            held += 1
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(held)]
+        for t in threads:
+            t.start()
+        try:
+            worker(first if first is not None and segments[0][2] == 0 else None)
+            for t in threads:
+                t.join()
+        finally:
+            for _ in range(held):
+                slot.release()
+            if errors:
+                hasher.stop()
+                write_part_info(part_path, info)
+        if errors:
+            if isinstance(errors[0], RangeNotHonoured):
+                discard_part(part_path)
+                raise requests.ConnectionError(f"Server stopped honouring Range requests for {url}, restarting")
+            raise errors[0]
+        started = time.perf_counter()
+        sha256 = hasher.finish()
+        if trace:
+            trace.add("hash", time.perf_counter() - started)
+        check_download(url, part_path, total, sha256, checks)
+        record = self.commit(key, url, path, info.get("final_url"), info.get("etag"), info.get("last_modified"), total, total, sha256)
+        meter.finish()
+        return record
+
+    def commit(self, key, url, path, final_url, etag, last_modified, content_length, size, sha256):
+        # Move a verified path + ".part" into the store, link path to it and remember it in the cache
+        store_installer(path + ".part", path, sha256)
+        discard_part(path + ".part", keep_data=True)
+        if self.cache and key:
+            self.cache.store(key, url, path, final_url, etag, last_modified, content_length, size, sha256)
+        return {"path": path, "final_url": final_url, "etag": etag, "last_modified": last_modified,
+                "content_length": content_length, "size": size, "sha256": sha256}
+
+    def share(self, record, url, path, progress, key, sha256, size, trace):
+        # Give path the installer another fetch produced (record, as returned by fetch_leader)
+        if sha256 and record["sha256"] != sha256:
+            raise IntegrityError(f"{url} has SHA-256 {record['sha256']}, expected {sha256}")
+        if size is not None and record["size"] != size:
+            raise IntegrityError(f"{url} is {record['size']} bytes, expected {size}")
+        if os.path.abspath(record["path"]) != os.path.abspath(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            link_installer(record["path"], path)
+        if self.cache and key:
+            self.cache.store(key, url, path, record["final_url"], record.get("etag"), record.get("last_modified"),
+                             record.get("content_length"), record["size"], record["sha256"])
+        if trace:
+            trace.downloaded("shared")
+        if progress:
+            progress(record["size"], record["size"], 0.0, 0.0)
+        return dict(record, path=path)
+
+    def fetch_range(self, url, part_path, seg, meter, validator, stop, hasher, trace=None, response=None, total=None):
+        start, end = seg[0], seg[1]
+        if response is None:
+            headers = {"Range": f"bytes={start + seg[2]}-{end - 1}"}
+            if validator:
+                headers["If-Range"] = validator
+            response = self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT, headers=headers)
+            if trace:
+                trace.response(response)
+            if response.status_code != 206:
+                response.close()
+                if response.status_code == 200:
+                    raise RangeNotHonoured()
+                response.raise_for_status()
+                raise requests.ConnectionError(f"Unexpected status {response.status_code} for a range request")
+            got_start, got_total = parse_content_range(response.headers.get("Content-Range"))
+            if got_start != start + seg[2] or (total and got_total and got_total != total):
+                response.close()
+                raise RangeNotHonoured()  # another mirror, or a different file than the one we started
+
+        def on_chunk(chunk):
+            offset = start + seg[2]
+            seg[2] += len(chunk)
+            hasher.written(offset, chunk)
+            meter.update(len(chunk))
+
+        # Unbuffered, so bytes counted in seg[2] are already visible to the hasher's reader
+        with response, open(part_path, "r+b", buffering=0) as f:
+            f.seek(start + seg[2])
+            copy_body(response, f, on_chunk, limit=end - start - seg[2], stop=stop, trace=trace, limiter=self.limiter)
+        if seg[2] >= end - start:
+            hasher.segment_done()
+        if seg[2] < end - start and not stop.is_set():
+            raise requests.ConnectionError(f"Range {start}-{end - 1} closed after {seg[2]} bytes")
+
+    def submit(self, job_id, url, path, on_event, key=None, checks=None, trace=None, priority=0, prepare=None):
+        # Queue one download in the background. key is the cache key, checks the expected
+        # sha256/size as keyword arguments and trace a PhaseTrace (see fetch and expected_checks).
+        # Higher priorities start first (see download_priority). prepare(path), if given, runs on
+        # the worker after the download (e.g. unpack_installer) and "done" reports what it returns.
+        # on_event(kind, job_id, payload) is called from the worker thread with:
+        #   ("start", job_id, None), ("progress", job_id, (done, total, rate, eta)),
+        #   ("done", job_id, path) or ("error", job_id, message)
+        def job():
+            on_event("start", job_id, None)
+            try:
+                self.fetch(url, path, progress=lambda *info: on_event("progress", job_id, info), key=key, trace=trace, **(checks or {}))
+                ready = prepare(path) if prepare else path
+            except Exception as e:
+                on_event("error", job_id, str(e))
+                return
+            on_event("done", job_id, ready)
+        return self.schedule(job, url, key, (checks or {}).get("size"), priority)
+
+    def download_many(self, jobs, progress=None, traces=None, priorities=None):
+        # Blocking variant for callers without an event loop.
+        # jobs: list of (app_name, url, path) or (app_name, url, path, checks), checks as in submit
+        # progress: optional callable(app_name, done, total, rate, eta), called from worker threads
+        # traces: optional {app_name: PhaseTrace}, priorities: optional {app_name: priority}
+        # Yields (app_name, path, error) in completion order; error is None on success.
+        def report(app_name):
+            return (lambda *info: progress(app_name, *info)) if progress else None
+        futures = {}
+        for app_name, url, path, *checks in jobs:
+            trace = traces.get(app_name) if traces else None
+            checks = checks[0] if checks else {}
+            run = partial(self.fetch, url, path, report(app_name), app_name, trace=trace, **checks)
+            future = self.schedule(run, url, app_name, checks.get("size"), priorities.get(app_name, 0) if priorities else 0)
+            futures[future] = (app_name, path)
+        for future in as_completed(futures):
+            app_name, path = futures[future]
+            try:
+                future.result()
+                yield app_name, path, None
+            except Exception as e:
+                yield app_name, path, e
+
+    def shutdown(self):
+        with self.lock:
+            for job in self.pending:
+                job["future"].cancel()
+            self.pending = []
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.probe_pool:
+            self.probe_pool.shutdown(wait=False, cancel_futures=True)
+
+class RangeNotHonoured(Exception):
+    # A ranged request came back as a full 200, e.g. because If-Range no longer matched
+    pass
+
+class IntegrityError(Exception):
+    # A download doesn't match the sha256/size from apps.json; never retried or installed
+    pass
+
+class FrontierHasher:
+    # SHA-256 of a segmented download whose ranges finish out of order. Bytes are hashed as soon
+    # as everything before them is on disk: a chunk written right at the frontier is hashed from
+    # memory by the thread that downloaded it, and when a range completes and closes a gap, a
+    # background thread reads the bytes behind it back (normally straight from the page cache).
+    # Ranges are fetched in file order, so the digest is ready moments after the last byte.
+    def __init__(self, part_path, segments):
+        self.part_path = part_path
+        self.segments = segments  # the download's [start, end, done] list, updated by fetch_range
+        self.digest = hashlib.sha256()
+        self.position = 0  # bytes hashed so far
+        self.cond = threading.Condition()
+        self.closing = False
+        self.stopped = False
+        self.error = None
+        self.thread = threading.Thread(target=self.catch_up, daemon=True)
+        self.thread.start()
+
+    def frontier(self):
+        # End of the run of downloaded bytes starting at offset 0
+        reach = 0
+        for start, end, done in self.segments:
+            reach = start + done
+            if done < end - start:
+                break
+        return reach
+
+    def written(self, offset, chunk):
+        with self.cond:
+            if offset == self.position:
+                self.digest.update(chunk)
+                self.position += len(chunk)
+
+    def segment_done(self):
+        with self.cond:
+            self.cond.notify()
+
+    def catch_up(self):
+        try:
+            with open(self.part_path, "rb") as f:
+                while True:
+                    with self.cond:
+                        while not self.stopped and not self.closing and self.frontier() <= self.position:
+                            self.cond.wait(0.5)
+                        start, end = self.position, min(self.frontier(), self.position + 1024 * 1024)
+                        if self.stopped or end <= start:
+                            return  # stopped, or closing with everything hashed
+                    f.seek(start)
+                    block = f.read(end - start)
+                    with self.cond:
+                        if self.position == start:  # not overtaken by written() meanwhile
+                            self.digest.update(block)
+                            self.position += len(block)
+        except OSError as e:
+            self.error = e
+
+    def finish(self):
+        # Returns the hex digest once the whole file is hashed
+        with self.cond:
+            self.closing = True
+            self.cond.notify()
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.digest.hexdigest()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join()
+
+def mirror_list(url):
+    # An apps.json "url" is one URL or a list of mirrors, best guess first
+    if isinstance(url, str):
+        return [url.strip()] if url.strip() else []
+    return [u.strip() for u in url or [] if isinstance(u, str) and u.strip()]
+
+def format_urls(url):
+    # For the editor: mirrors separated by spaces (URLs can't contain any)
+    return " ".join(mirror_list(url))
+
+def parse_urls(text):
+    # Editor text back to an apps.json "url": a string for one URL, a list for mirrors
+    urls = text.split()
+    return urls[0] if len(urls) == 1 else urls
+
+def expected_checks(app_data):
+    # The optional integrity fields of an apps.json entry, as keyword arguments for DownloadEngine.fetch
+    checks = {}
+    if app_data.get("sha256"):
+        checks["sha256"] = app_data["sha256"].strip().lower()
+    if app_data.get("size"):
+        checks["size"] = int(app_data["size"])
+    return checks
+
+def download_priority(app_data):
+    # The optional "priority" field of an apps.json entry: higher numbers download first
+    try:
+        return int(app_data.get("priority") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def content_filename(r):
+    # The file name a response says it is: Content-Disposition, else the end of its URL
+    from urllib.parse import unquote
+    disposition = r.headers.get("Content-Disposition") or ""
+    match = re.search(r"filename\*\s*=\s*[^']*'[^']*'([^;]+)", disposition) or re.search(r'filename\s*=\s*"?([^";]+)', disposition)
+    name = unquote(match.group(1).strip()) if match else unquote(urlsplit(r.url).path.rsplit("/", 1)[-1])
+    return os.path.basename(name.replace("\\", "/")) or None
+
+def installer_extension(url, info=None):
+    # What to save url's download as: the extension of the file name the server gave, of where
+    # its redirects ended, what its content type says, then that of url itself, else .exe
+    info = info or {}
+    names = [info.get("filename"), urlsplit(info.get("final_url") or "").path]
+    content_type = (info.get("content_type") or "").split(";")[0].strip().lower()
+    for ext in [os.path.splitext(name or "")[1].lower() for name in names] + [CONTENT_TYPE_EXTENSIONS.get(content_type), os.path.splitext(urlsplit(url).path)[1].lower()]:
+        if ext in INSTALLER_EXTENSIONS:
+            return ext
+    return ".exe"
+
+def installer_path(directory, app_name, url, metadata=None):
+    # Where an app's installer is saved; app_name is its Catalog.label, metadata (a MetadataCache)
+    # knows the real file type
+    url = (mirror_list(url) or [""])[0]
+    file_name = re.sub(r'[\\/:*?"<>|]', "_", app_name)
+    return os.path.join(directory, file_name + installer_extension(url, metadata.get(url) if metadata else None))
+
+def check_size(url, part_path, total, size):
+    # Fail before the body is downloaded when the server already says the length is wrong
+    if size and total and total != size:
+        discard_part(part_path)
+        raise IntegrityError(f"{url} is {total} bytes, expected {size}")
+
+def check_download(url, part_path, length, sha256, checks):
+    expected_sha256, expected_size = checks
+    problem = None
+    if expected_size and length != expected_size:
+        problem = f"{length} bytes, expected {expected_size}"
+    elif expected_sha256 and sha256 != expected_sha256:
+        problem = f"SHA-256 {sha256}, expected {expected_sha256}"
+    if problem:
+        discard_part(part_path)
+        raise IntegrityError(f"Download of {url} failed verification: {problem}")
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    hash_file_prefix(path, os.path.getsize(path), digest)
+    return digest.hexdigest()
+
+def verify_installers(cache, app_catalog=None, directory="installers", workers=None):
+    # Re-hashes every installer in directory, in parallel: hashlib releases the GIL, so a
+    # thread per core keeps them all busy. A file is checked against its app's sha256 in
+    # app_catalog when there is one, else against the hash recorded when it was downloaded.
+    # Files that fail are dropped from the cache so the next install downloads them again.
+    # Returns [{"app", "path", "sha256", "status"}], status being "ok", "mismatch" or "unchecked".
+    try:
+        paths = sorted(e.path for e in os.scandir(directory) if e.is_file() and not e.name.endswith((".part", ".json", ".tmp", ".link")))
+    except FileNotFoundError:
+        return []
+    by_path = {}
+    if cache:
+        with cache.lock:
+            by_path = {os.path.normpath(entry["path"]): (key, entry) for key, entry in cache.entries.items()}
+
+    def check(path):
+        key, entry = by_path.get(os.path.normpath(path), (None, {}))
+        app_name = key or os.path.splitext(os.path.basename(path))[0]
+        app = app_catalog.find_label(app_name) if app_catalog else None
+        expected = (app and expected_checks(app["data"]).get("sha256")) or entry.get("sha256")
+        sha256 = hash_file(path)
+        status = "unchecked" if not expected else ("ok" if sha256 == expected else "mismatch")
+        if status == "mismatch" and key:
+            cache.forget(key)
+        recorded = entry.get("sha256")
+        if status == "mismatch" and recorded and recorded != sha256:
+            stored = store_object(path, recorded)
+            if os.path.exists(stored) and os.path.samefile(stored, path):
+                os.remove(stored)  # its name no longer matches its bytes, so it must not be linked again
+        return {"app": app_name if (key or app) else None, "path": path, "sha256": sha256, "status": status}
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 4, thread_name_prefix="verify") as pool:
+        return list(pool.map(check, paths))
+
+def split_ranges(total, count):
+    size = -(-total // count)
+    return [[start, min(start + size, total), 0] for start in range(0, total, size)]
+
+def is_transient(error):
+    # Network hiccups and server-side errors are worth retrying; 4xx responses are not.
+    # copy_body reads below requests, so socket errors can also arrive unwrapped.
+    import http.client
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                              TimeoutError, ConnectionError, http.client.HTTPException))
+
+def copy_body(response, f, on_chunk, limit=None, stop=None, trace=None, limiter=None):
+    # Copies a streamed response body into the open file f and returns the byte count.
+    # All reads land in one preallocated buffer: straight from the socket through http.client's
+    # readinto when the body isn't content-encoded, through urllib3's decoder otherwise. Reads
+    # start at TRANSFER_CHUNK_MIN and double while each one fills quickly (up to
+    # TRANSFER_CHUNK_MAX), so a fast link costs a few hundred loop turns per GB and a slow one
+    # still reports progress often. on_chunk(view) sees each piece after it is written; the view
+    # is only valid during the call. limit caps the bytes read, stop is checked between reads.
+    # A connection that closes early just ends the copy; callers compare the count.
+    # trace gets the time spent reading, writing and in on_chunk (mostly hashing).
+    # limiter: optional BandwidthLimiter; its waits count as transfer time.
+    raw = response.raw
+    fp = getattr(raw, "_fp", None)
+    encoding = response.headers.get("Content-Encoding", "identity").lower()
+    if fp is not None and hasattr(fp, "readinto") and encoding in ("", "identity"):
+        read_into = fp.readinto
+    else:
+        fp = None
+        raw.enforce_content_length = False
+
+        def read_into(view):
+            data = raw.read(len(view), decode_content=True)
+            view[:len(data)] = data
+            return len(data)
+    view = memoryview(bytearray(TRANSFER_CHUNK_MAX))
+    size = TRANSFER_CHUNK_MIN
+    copied = 0
+    reading = writing = handling = 0.0
+    try:
+        while limit is None or copied < limit:
+            want = size if limit is None else min(size, limit - copied)
+            capped = limiter.chunk() if limiter else None
+            if capped:
+                want = min(want, capped)
+            started = time.perf_counter()
+            n = read_into(view[:want])
+            read_done = time.perf_counter()
+            reading += read_done - started
+            if not n:
+                break
+            if capped:
+                reading += limiter.consume(n)
+            chunk = view[:n]
+            f.write(chunk)
+            written = time.perf_counter()
+            on_chunk(chunk)
+            writing += written - read_done
+            handling += time.perf_counter() - written
+            copied += n
+            elapsed = read_done - started
+            if n == want and elapsed < TRANSFER_READ_TARGET / 2:
+                size = min(size * 2, TRANSFER_CHUNK_MAX)
+            elif elapsed > TRANSFER_READ_TARGET * 2:
+                size = max(size // 2, TRANSFER_CHUNK_MIN)
+            if stop is not None and stop.is_set():
+                break
+    finally:
+        if trace:
+            trace.add_io(reading, writing, handling, copied)
+    if fp is not None and fp.isclosed() and (limit is None or copied == limit):
+        # The whole body went past urllib3, so hand the connection back to the pool ourselves
+        raw.release_conn()
+    return copied
+
+def preallocate(path, size):
+    # Create path with size bytes reserved, so the filesystem can lay the file out in one piece
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass
+        f.truncate(size)
+
+def parse_content_range(value):
+    # "bytes 100-999/1000" -> (100, 1000); total is 0 when the server sends "*"
+    match = re.match(r"bytes\s+(\d+)-\d+/(\d+|\*)", value or "")
+    if not match:
+        return None, 0
+    return int(match.group(1)), (int(match.group(2)) if match.group(2) != "*" else 0)
+
+def resume_point(url, part_path):
+    # Returns (bytes already on disk, saved validators) for a .part file left by an earlier attempt.
+    # Segmented downloads are preallocated, so their progress lives in info["segments"] instead.
+    try:
+        with open(part_path + ".json", "r") as f:
+            info = json.load(f)
+        size = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        return 0, {}
+    if info.get("url") != url or (info.get("total") and size > info["total"]):
+        discard_part(part_path)
+        return 0, {}
+    if info.get("segments"):
+        return 0, info
+    if "done" in info:
+        return min(info["done"], size), info  # preallocated, so the size says nothing
+    return size, info
+
+def write_part_info(part_path, info):
+    with open(part_path + ".json", "w") as f:
+        json.dump(info, f)
+
+def discard_part(part_path, keep_data=False):
+    for leftover in ([part_path + ".json"] if keep_data else [part_path, part_path + ".json"]):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+
+STORE_DIR = ".store"  # installers/.store/<sha256> holds one copy of every distinct installer
+STORE_PRUNE_GRACE = 60  # seconds a new store object is kept before its first link could be missing
+
+def store_object(path, sha256):
+    # Where the store keeps the installer with this hash, for an installer saved at path
+    return os.path.join(os.path.dirname(path) or ".", STORE_DIR, sha256)
+
+def store_installer(part_path, path, sha256):
+    # Move a finished download into the store and point path at it. When the store already
+    # holds these bytes (same installer under another name or URL) the new copy is dropped.
+    stored = store_object(path, sha256)
+    os.makedirs(os.path.dirname(stored), exist_ok=True)
+    if os.path.exists(stored):
+        os.remove(part_path)
+    else:
+        os.replace(part_path, stored)
+    link_installer(stored, path)
+
+def link_installer(source, path):
+    # Make path the same file as source: a hardlink, else a symlink (e.g. across volumes), else a copy.
+    # Built under a temporary name and swapped in, so path is never missing or half written.
+    tmp_path = path + ".link"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(os.path.realpath(source)), tmp_path)
+        except OSError:
+            import shutil
+            shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, path)
+
+def prune_store(directory):
+    # Delete stored installers that no name in directory refers to any more (skipping fresh
+    # ones, which a download may have moved in but not linked yet)
+    store = os.path.join(directory or ".", STORE_DIR)
+    try:
+        names = list(os.scandir(directory or "."))
+        objects = [e for e in os.scandir(store) if e.is_file()]
+    except FileNotFoundError:
+        return
+    linked = {os.path.realpath(e.path) for e in names if e.is_symlink()}
+    recent = time.time() - STORE_PRUNE_GRACE
+    for entry in objects:
+        info = entry.stat()
+        if info.st_nlink <= 1 and info.st_mtime < recent and os.path.realpath(entry.path) not in linked:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+ARCHIVE_RUNNABLE = (".exe", ".msi")  # what pick_entry looks for in an archive without an "entry"
+ARCHIVE_MARKER = ".bores-archive"  # in an extracted folder: which download it was extracted from
+ARCHIVE_EXTRACT_WORKERS = None  # threads unpacking one archive, None for one per core
+PACKAGE_EXTENSIONS = (".msix", ".msixbundle", ".appx", ".appxbundle")  # zip containers Windows installs as they are
+PACKAGE_MANIFESTS = ("AppxManifest.xml", "AppxMetadata/AppxBundleManifest.xml")  # how to tell one without its extension
+
+def is_zip(path):
+    # By the file's magic bytes: a local file header, or the end record of an empty archive
+    with open(path, "rb") as f:
+        return f.read(4) in (b"PK\x03\x04", b"PK\x05\x06")
+
+def pick_entry(names, entry=None):
+    # The member of an archive to run: the apps.json "entry" (a path inside the archive, or a
+    # file name pattern like "Setup*.exe" matched at any depth), else the only installer in it,
+    # else the only one whose name says setup or install
+    import fnmatch
+    files = [name for name in names if not name.endswith("/") and not name.startswith("__MACOSX/")]
+    if entry:
+        pattern = entry.replace("\\", "/").lower()
+        matches = [name for name in files if fnmatch.fnmatch(name.lower(), pattern)
+                   or ("/" not in pattern and fnmatch.fnmatch(name.rsplit("/", 1)[-1].lower(), pattern))]
+        if not matches:
+            raise FileNotFoundError(f"{entry} is not in the archive")
+        return min(matches, key=lambda name: name.count("/"))
+    runnable = [name for name in files if name.lower().endswith(ARCHIVE_RUNNABLE)]
+    candidates = runnable
+    if len(candidates) > 1:
+        candidates = [name for name in runnable if re.search(r"setup|install", name.rsplit("/", 1)[-1], re.IGNORECASE)]
+    if len(candidates) != 1:
+        raise ValueError(f"can't tell which file in the archive to run, set \"entry\" in apps.json (found: {', '.join(runnable) or 'no installers'})")
+    return candidates[0]
+
+def archive_parts(name):
+    # Path components an archive member is extracted to: no "..", drives or absolute paths,
+    # so names can't climb out of the destination folder
+    return [part.replace(":", "_") for part in name.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+
+def extract_archive(path, destination, workers=ARCHIVE_EXTRACT_WORKERS):
+    # Unpack the zip at path into destination, reading straight from the downloaded file.
+    # Members are dealt out biggest first to a thread per core, each with its own handle on
+    # the file; zlib and the CRC checks release the GIL, so an archive of many files inflates
+    # on all cores (one huge member still takes one). Everything goes into destination + ".tmp"
+    # first and is renamed when complete, so a half extracted folder is never used.
+    import shutil
+    import zipfile
+    with zipfile.ZipFile(path) as archive:
+        members = sorted(archive.infolist(), key=lambda m: m.file_size, reverse=True)
+    tmp_path = destination + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    workers = max(1, min(workers or os.cpu_count() or 4, len(members)))
+    shares = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for member in members:
+        # Folders are made here so the threads don't race to create the same ones
+        parts = archive_parts(member.filename)
+        if not parts:
+            continue
+        target = os.path.join(tmp_path, *parts)
+        os.makedirs(target if member.is_dir() else os.path.dirname(target), exist_ok=True)
+        if member.is_dir():
+            continue
+        least = loads.index(min(loads))
+        shares[least].append((member, target))
+        loads[least] += member.file_size
+
+    def unpack(share):
+        with zipfile.ZipFile(path) as archive:
+            for member, target in share:
+                with archive.open(member) as source, open(target, "wb") as f:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract") as pool:
+        list(pool.map(unpack, shares))
+    shutil.rmtree(destination, ignore_errors=True)
+    os.replace(tmp_path, destination)
+
+def unpack_installer(path, app_data, trace=None):
+    # For a download that turns out to be a zip (the app's "url" can point at one), extract it
+    # into a folder next to it (installers/<App>/) and return the path of the file in it to run
+    # (see pick_entry); anything else is returned as is. MSIX/APPX packages are zips too, but
+    # they are installed whole. An archive already extracted from the same download isn't
+    # extracted again.
+    if path.lower().endswith(PACKAGE_EXTENSIONS) or not is_zip(path):
+        return path
+    import zipfile
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        if any(manifest in names for manifest in PACKAGE_MANIFESTS):
+            return path
+        inner = pick_entry(names, app_data.get("entry"))
+    destination = os.path.splitext(path)[0]
+    info = os.stat(path)
+    stamp = f"{info.st_size} {info.st_mtime_ns}"
+    marker = os.path.join(destination, ARCHIVE_MARKER)
+    try:
+        with open(marker, "r") as f:
+            current = f.read() == stamp
+    except OSError:
+        current = False
+    if not current:
+        print(f"Extracting {path}")
+        started = time.perf_counter()
+        extract_archive(path, destination)
+        with open(marker, "w") as f:
+            f.write(stamp)
+        if trace:
+            trace.add("extract", time.perf_counter() - started)
+    return os.path.join(destination, *archive_parts(inner))
+
+def hash_file_prefix(path, length, digest):
+    with open(path, "rb") as f:
+        while length > 0:
+            block = f.read(min(length, 1024 * 1024))
+            if not block:
+                break
+            digest.update(block)
+            length -= len(block)
+
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+# LAN peer cache settings
+PEERS = []  # other instances to try before the origin, e.g. ["http://10.0.0.5:8731"]
+PEER_PORT = 8731  # where an instance shares its installers/ (see PeerServer)
+PEER_DISCOVERY_PORT = 8732  # UDP port sharing instances answer discovery broadcasts on
+PEER_DISCOVERY_WAIT = 0.5  # seconds to collect answers to a discovery broadcast
+PEER_DISCOVERY_TTL = 60  # seconds before peers are discovered again
+PEER_INDEX_TTL = 30  # seconds a peer's list of installers is trusted
+PEER_HELLO = b"BORES-PEER?"
+INSTANCE_ID = os.urandom(8).hex()  # tells this process's own discovery answers apart from other peers'
+
+class PeerServer:
+    # Shares this machine's installers with other instances on the LAN over HTTP:
+    #   GET /index.json       what is here: url, origin validators, size and sha256 of every
+    #                         cached installer still in the store
+    #   GET /sha256/<hash>    one stored installer, with Range support so peers can resume and
+    #                         split downloads like they do against the origin
+    # Every request gets its own thread and file bodies go out with sendfile. With discovery on,
+    # it also answers PEER_HELLO broadcasts on PEER_DISCOVERY_PORT with its HTTP port.
+    def __init__(self, directory="installers", index_path=CACHE_INDEX, port=PEER_PORT, host="", discovery=True):
+        import http.server
+        self.directory = directory
+        self.index_path = index_path
+        self.discovery = discovery
+        self.httpd = http.server.ThreadingHTTPServer((host, port), self.make_handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True, name="peer-server").start()
+        if self.discovery:
+            threading.Thread(target=self.answer_discovery, daemon=True, name="peer-discovery").start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        fields = ("url", "final_url", "etag", "last_modified", "content_length", "size", "sha256")
+        return {"installers": [{field: entry.get(field) for field in fields} for entry in entries.values()
+                               if entry.get("sha256") and os.path.exists(self.object_path(entry["sha256"]))]}
+
+    def object_path(self, sha256):
+        return os.path.join(self.directory, STORE_DIR, sha256)
+
+    def answer_discovery(self):
+        import socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("", PEER_DISCOVERY_PORT))
+        except OSError as e:
+            print(f"Peer discovery is off: {e}")
+            return
+        sock.settimeout(1.0)
+        with sock:
+            while not self.stopped.is_set():
+                try:
+                    data, address = sock.recvfrom(256)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+                if data == PEER_HELLO:
+                    sock.sendto(f"BORES-PEER {self.port} {INSTANCE_ID}".encode(), address)
+
+    def make_handler(self):
+        import http.server
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.respond(send_body=False)
+
+            def do_GET(self):
+                self.respond(send_body=True)
+
+            def respond(self, send_body):
+                path = urlsplit(self.path).path
+                if path == "/index.json":
+                    body = json.dumps(server.index()).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    if send_body:
+                        self.wfile.write(body)
+                    return
+                match = re.fullmatch(r"/sha256/([0-9a-f]{64})", path)
+                try:
+                    f = open(server.object_path(match.group(1)), "rb") if match else None
+                except OSError:
+                    f = None
+                if f is None:
+                    self.send_error(404)
+                    return
+                with f:
+                    size = os.fstat(f.fileno()).st_size
+                    start, end = 0, size
+                    wanted = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", "").strip())
+                    if wanted and (wanted.group(1) or wanted.group(2)):
+                        if wanted.group(1):
+                            start = int(wanted.group(1))
+                            end = min(size, int(wanted.group(2)) + 1) if wanted.group(2) else size
+                        else:
+                            start = max(0, size - int(wanted.group(2)))  # the last N bytes
+                        if start >= size or end <= start:
+                            self.send_response(416)
+                            self.send_header("Content-Range", f"bytes */{size}")
+                            self.send_header("Content-Length", "0")
+                            self.end_headers()
+                            return
+                        self.send_response(206)
+                        self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+                    else:
+                        self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(end - start))
+                    self.send_header("Accept-Ranges", "bytes")
+                    self.send_header("ETag", f'"{match.group(1)}"')
+                    self.end_headers()
+                    if not send_body:
+                        return
+                    try:
+                        sent = self.connection.sendfile(f, start, end - start)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    with server.lock:
+                        server.bytes_sent += sent
+
+        return Handler
+
+def discover_peers(wait=PEER_DISCOVERY_WAIT):
+    # Broadcast PEER_HELLO on the LAN (and to this machine, so two instances on one box find
+    # each other) and return the base URLs of the sharing instances that answer, except our own
+    import socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    peers = {}  # instance id: base url, so an instance reached two ways is listed once
+    with sock:
+        for target in ("<broadcast>", "127.0.0.1"):
+            try:
+                sock.sendto(PEER_HELLO, (target, PEER_DISCOVERY_PORT))
+            except OSError:
+                pass
+        deadline = time.monotonic() + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, address = sock.recvfrom(256)
+            except OSError:
+                break
+            parts = data.decode("ascii", "replace").split()
+            if len(parts) == 3 and parts[0] == "BORES-PEER" and parts[1].isdigit() and parts[2] != INSTANCE_ID:
+                peers.setdefault(parts[2], f"http://{address[0]}:{parts[1]}")
+    return sorted(peers.values())
+
+# Icon cache settings
+ICON_SIZE = (20, 20)
+ICON_THUMB_DIR = os.path.join("icons", ".thumbs")
+
+class IconCache:
+    # Decodes and resizes each icon once. Resized copies are saved as small PNGs in
+    # icons/.thumbs, named after the source path, mtime and size, so a later start loads them
+    # with Tk's built-in PNG reader and never touches PIL. Loaded PhotoImages are kept in memory.
+    def __init__(self, thumb_dir=ICON_THUMB_DIR, size=ICON_SIZE):
+        self.thumb_dir = thumb_dir
+        self.size = size
+        self.images = {}  # (path, mtime_ns, file size): PhotoImage, or None if it failed to load
+        self.latest = {}  # icon_file: last result of get(), so peek() needs no disk access
+
+    def peek(self, icon_file):
+        # (found, image) from memory only; found is False when get() would have to hit the disk
+        if icon_file in self.latest:
+            return True, self.latest[icon_file]
+        return not icon_file, None
+
+    def get(self, icon_file):
+        if not icon_file:
+            return None
+        path = os.path.join("icons", icon_file)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (path, st.st_mtime_ns, st.st_size)
+        if key in self.images:
+            self.latest[icon_file] = self.images[key]
+            return self.images[key]
+        image = None
+        try:
+            thumb_path = self.thumb_path(key)
+            if not os.path.exists(thumb_path):
+                self.make_thumbnail(path, thumb_path)
+            image = tk.PhotoImage(file=thumb_path)
+        except Exception as e:
+            print(f"Failed to load icon {icon_file}: {e}")
+        self.images[key] = image
+        self.latest[icon_file] = image
+        return image
+
+    def thumb_path(self, key):
+        path, mtime_ns, file_size = key
+        name = hashlib.sha1(f"{path}|{mtime_ns}|{file_size}|{self.size}".encode("utf-8")).hexdigest()
+        return os.path.join(self.thumb_dir, name[:20] + ".png")
+
+    def make_thumbnail(self, path, thumb_path):
+        from PIL import Image
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        with Image.open(path) as img:
+            img = img.convert("RGBA").resize(self.size, Image.LANCZOS)
+        tmp_path = thumb_path + ".tmp"
+        img.save(tmp_path, format="PNG")
+        os.replace(tmp_path, thumb_path)
+
+SEARCH_DEBOUNCE_MS = 60  # wait this long after the last keystroke before filtering
+
+# Virtual grid geometry (pixels)
+GRID_COLUMN_WIDTH = 260
+GRID_ROW_HEIGHT = 44
+GRID_HEADER_HEIGHT = 52
+GRID_OVERSCAN = 4  # extra rows materialized above and below the viewport
+SAVE_DELAY_MS = 500  # edits within this long of each other are saved together
+ICON_LOAD_BUDGET = 0.008  # seconds of icon loading per idle slice, so the window stays responsive
 
 class AppInstallerGUI:
     def __init__(self, root):
@@ -45,23 +2561,42 @@ class AppInstallerGUI:
         self.root.configure(bg="#f4f4f4")
         self.root.minsize(800, 400)
 
-        self.check_vars = {}
+        self.selected = set()  # app ids checked for install; rows only mirror this
         self.install_mode = tk.StringVar(value="auto")  # 'auto', 'skip', 'manual'
         self.next_button = None
         self.pending_apps = []
         self.current_app_index = 0
         self.custom_app_fields = {}
-        self.app_widgets = {}  # (category, app_name): frame
         self.edit_mode = tk.StringVar(value="add")  # 'add', 'edit', 'remove'
         self.icon_preview_img = None
         self.icon_file_path = None
         self.category_labels = {}  # category: label widget
         self.category_trash_icons = {}  # category: trash button widget
+        self.category_frames = {}  # category: (header frame, canvas item)
+        self.columns = []  # [(category, [app_id, ...])] in display order
+        self.row_pool = []  # row widgets not bound to any app, ready for reuse
+        self.visible_rows = {}  # app_id: row widget currently on screen
+        self.refresh_pending = False
+        self.search_index = SearchIndex(catalog)
+        self.search_matches = None  # app ids matching the search box, or None when it's empty
+        self.search_job = None
+        self.blank_icon = tk.PhotoImage(width=ICON_SIZE[0], height=ICON_SIZE[1])  # stand-in for missing icons
+        self.download_engine = None  # created on the first download, see engine
+        self.install_pool = None  # one installer at a time, created on the first install (see start_install)
+        self.peer_server = None  # running while "Share on LAN" is ticked
+        self.metadata = MetadataCache()  # sizes and file types shown in the grid, see prefetch_info
+        self.icons = IconCache()
+        self.icon_backlog = []  # app ids whose rows still show the blank icon
+        self.icon_job = None
+        self.events = queue.Queue()  # (kind, app_name, payload) posted by download workers
+        self.downloads = {}  # app_id: {"name", "run_installer", "after_manual", "prefetch", "status", "progress", "path", "trace"}
+        self.batch = None  # {"mode", "remaining", "failed"} for the current Install Selected run
+        self.store = CatalogStore(catalog)
+        self.save_job = None
+        self.telemetry = Telemetry()
 
-        # Load default JSON for revert
-        import copy
-        with open("apps.json", "r") as f:
-            self.default_json = copy.deepcopy(f.read())
+        # apps.json as read at startup, for revert
+        self.default_json = catalog.source_text
 
         # Top options
         options_frame = tk.Frame(root, bg="#f4f4f4")
@@ -72,6 +2607,20 @@ class AppInstallerGUI:
         skip_rb.pack(side="left", padx=10)
         manual_rb = ttk.Radiobutton(options_frame, text="Manual Step-Through", variable=self.install_mode, value="manual", command=self.update_mode_explanation)
         manual_rb.pack(side="left", padx=10)
+        # Download scheduling: which installers go first and how much of the link they may use
+        self.order_var = tk.StringVar(value=DOWNLOAD_ORDERS[DOWNLOAD_ORDER])
+        order_label = tk.Label(options_frame, text="Download", bg="#f4f4f4")
+        order_label.pack(side="left", padx=(20, 4))
+        order_combo = ttk.Combobox(options_frame, textvariable=self.order_var, values=list(DOWNLOAD_ORDERS.values()), state="readonly", width=14)
+        order_combo.pack(side="left")
+        order_combo.bind("<<ComboboxSelected>>", lambda e: self.apply_download_settings())
+        limit_label = tk.Label(options_frame, text="Limit (MB/s)", bg="#f4f4f4")
+        limit_label.pack(side="left", padx=(10, 4))
+        self.limit_var = tk.StringVar(value=f"{BANDWIDTH_LIMIT / 1024 ** 2:g}" if BANDWIDTH_LIMIT else "")
+        limit_entry = ttk.Entry(options_frame, width=6, textvariable=self.limit_var)
+        limit_entry.pack(side="left")
+        limit_entry.bind("<Return>", lambda e: self.apply_download_settings())
+        limit_entry.bind("<FocusOut>", lambda e: self.apply_download_settings())
 
         self.mode_explanation = tk.Label(root, text="", font=("Helvetica", 10), bg="#f4f4f4", fg="#444444")
         self.mode_explanation.pack(pady=(0, 8))
@@ -88,35 +2637,58 @@ class AppInstallerGUI:
         title = tk.Label(root, text="Select Apps to Install", font=("Helvetica", 18), bg="#f4f4f4")
         title.pack(pady=10)
 
-        install_button = ttk.Button(root, text="Install Selected", command=self.install_selected)
-        install_button.pack(pady=(0, 10))
+        button_row = tk.Frame(root, bg="#f4f4f4")
+        button_row.pack(pady=(0, 10))
+        install_button = ttk.Button(button_row, text="Install Selected", command=self.install_selected)
+        install_button.pack(side="left", padx=4)
+        self.verify_button = ttk.Button(button_row, text="Verify Downloads", command=self.verify_downloads)
+        self.verify_button.pack(side="left", padx=4)
+        # Share on LAN: serve our installers to other instances
+        self.share_var = tk.BooleanVar(value=False)
+        share_check = ttk.Checkbutton(button_row, text="Share on LAN", variable=self.share_var, command=self.toggle_sharing)
+        share_check.pack(side="left", padx=4)
+        # Use LAN peers: look for installers on discovered instances before downloading
+        self.discover_var = tk.BooleanVar(value=False)
+        discover_check = ttk.Checkbutton(button_row, text="Use LAN peers", variable=self.discover_var, command=self.toggle_discovery)
+        discover_check.pack(side="left", padx=4)
+
+        # Search box: filters the grid as you type (debounced)
+        search_row = tk.Frame(root, bg="#f4f4f4")
+        search_row.pack(pady=(0, 6))
+        search_label = tk.Label(search_row, text="Search", bg="#f4f4f4")
+        search_label.pack(side="left", padx=(2, 8))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_row, width=32, textvariable=self.search_var)
+        search_entry.pack(side="left")
+        search_entry.bind("<KeyRelease>", self.schedule_search)
+        search_entry.bind("<Escape>", lambda e: (self.search_var.set(""), self.apply_search()))
 
-        # Responsive canvas with horizontal and vertical scrollbars using grid
+        # Responsive canvas with horizontal and vertical scrollbars using grid.
+        # The canvas is virtual: it is sized for the whole catalog but only holds row
+        # widgets for apps in or near the viewport (see refresh_viewport).
         self.canvas_frame = tk.Frame(root)
         self.canvas_frame.pack(fill="both", expand=True)
         self.canvas = tk.Canvas(self.canvas_frame, bg="#f4f4f4", highlightthickness=0)
         self.scroll_y = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.canvas.yview)
         self.scroll_x = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.canvas.xview)
-        self.scroll_frame = ttk.Frame(self.canvas)
 
-        self.canvas.create_window((0, 0), window=self.scroll_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scroll_y.set, xscrollcommand=self.scroll_x.set)
+        def on_scroll_y(*args):
+            self.scroll_y.set(*args)
+            self.schedule_viewport_refresh()
+        def on_scroll_x(*args):
+            self.scroll_x.set(*args)
+            self.schedule_viewport_refresh()
+        self.canvas.configure(yscrollcommand=on_scroll_y, xscrollcommand=on_scroll_x)
 
         self.canvas.grid(row=0, column=0, sticky="nsew")
         self.scroll_y.grid(row=0, column=1, sticky="ns")
         self.scroll_x.grid(row=1, column=0, sticky="ew")
         self.canvas_frame.grid_rowconfigure(0, weight=1)
         self.canvas_frame.grid_columnconfigure(0, weight=1)
-        self.scroll_frame.grid_rowconfigure(0, weight=1)
-        for i in range(21):  # allow up to 20 app columns + 1 for trash
-            self.scroll_frame.grid_columnconfigure(i, weight=1)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_viewport_refresh())
 
-        def on_canvas_configure(event):
-            self.canvas.itemconfig("all", width=event.width)
-        self.canvas.bind("<Configure>", on_canvas_configure)
-        self.scroll_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-
-        self.render_app_grid()
+        # The grid is laid out once the window is on screen; icons follow in idle slices
+        self.root.after(1, self.render_app_grid)
 
         # Custom Apper Maker section (vertically stacked) - now at the bottom
         edit_frame = tk.LabelFrame(root, text="Custom Apper Maker", bg="#f4f4f4")
@@ -138,13 +2710,15 @@ class AppInstallerGUI:
         name_row.pack(fill="x", pady=2)
         name_label = tk.Label(name_row, text="Name", bg="#f4f4f4")
         name_label.pack(side="left", padx=(2, 8))
-        name_entry = ttk.Entry(name_row, width=24)
+        # Editable combobox so existing names can be autocompleted from the search index
+        name_entry = ttk.Combobox(name_row, width=22, postcommand=self.update_name_completions)
         name_entry.pack(side="left")
         self.custom_app_fields["name"] = name_entry
         icon_preview = tk.Label(name_row, bg="#f4f4f4")
         icon_preview.pack(side="left", padx=8)
         self.icon_preview = icon_preview
-        name_entry.bind("<KeyRelease>", self.update_edit_fields)
+        name_entry.bind("<KeyRelease>", self.on_name_typed)
+        name_entry.bind("<<ComboboxSelected>>", self.update_edit_fields)
 
         # Icon field (file picker)
         icon_row = tk.Frame(edit_frame, bg="#f4f4f4")
@@ -173,9 +2747,8 @@ class AppInstallerGUI:
         cat_row.pack(fill="x", pady=2)
         cat_label = tk.Label(cat_row, text="Category", bg="#f4f4f4")
         cat_label.pack(side="left", padx=(2, 8))
-        from tkinter import ttk as ttk2
         self.cat_var = tk.StringVar()
-        self.cat_combo = ttk2.Combobox(cat_row, textvariable=self.cat_var, state="readonly", width=22)
+        self.cat_combo = ttk.Combobox(cat_row, textvariable=self.cat_var, state="readonly", width=22)
         self.cat_combo.pack(side="left")
         cat_add_btn = ttk.Button(cat_row, text="New Category", command=self.add_new_category)
         cat_add_btn.pack(side="left", padx=4)
@@ -188,51 +2761,268 @@ class AppInstallerGUI:
 
         self.update_edit_fields()
 
+        # Last Run summary: slowest apps and where their time went; shown after the first install
+        self.last_run_frame = tk.LabelFrame(root, text="Last Run", bg="#f4f4f4")
+        self.last_run_label = tk.Label(self.last_run_frame, text="", justify="left", anchor="w", font=("Consolas", 9), bg="#f4f4f4")
+        self.last_run_label.pack(fill="x", padx=6, pady=4)
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(EVENT_POLL_MS, self.poll_events)
+        self.root.after_idle(self.search_index.build_async)
+
+    @property
+    def engine(self):
+        if self.download_engine is None:
+            self.download_engine = DownloadEngine(cache=InstallerCache(), mirrors=MirrorStats(), peers=PEERS, discover=self.discover_var.get(), metadata=self.metadata)
+        return self.download_engine
+
+    def toggle_sharing(self):
+        if self.share_var.get():
+            try:
+                self.peer_server = PeerServer().start()
+            except OSError as e:
+                self.share_var.set(False)
+                self.show_notification(f"Couldn't share on port {PEER_PORT}: {e}", error=True)
+                return
+            self.show_notification(f"Sharing installers on port {self.peer_server.port}")
+        elif self.peer_server:
+            self.peer_server.stop()
+            self.peer_server = None
+
+    def toggle_discovery(self):
+        if self.download_engine:
+            self.download_engine.discover = self.discover_var.get()
+
+    def apply_download_settings(self):
+        # Push the order and bandwidth limit boxes into the engine; a new limit also
+        # applies to downloads that are already running. Returns False on a bad limit.
+        text = self.limit_var.get().strip()
+        try:
+            limit = float(text) if text else 0.0
+            if limit < 0:
+                raise ValueError
+        except ValueError:
+            self.show_notification("The limit must be a number of MB/s (empty for no limit).", error=True)
+            return False
+        order = next(key for key, label in DOWNLOAD_ORDERS.items() if label == self.order_var.get())
+        if self.download_engine or limit or order != DOWNLOAD_ORDER:
+            self.engine.order = order
+            self.engine.limiter.rate = limit * 1024 ** 2
+        return True
+
+    def on_close(self):
+        if self.save_job:
+            self.root.after_cancel(self.save_job)
+            self.save_job = None
+        self.store.flush()
+        if self.download_engine:
+            self.download_engine.shutdown()
+        if self.install_pool:
+            self.install_pool.shutdown(wait=False, cancel_futures=True)
+        if self.peer_server:
+            self.peer_server.stop()
+        self.root.destroy()
+
     def render_app_grid(self):
-        # Remove all app widgets and category labels/trash icons
-        for frame in self.app_widgets.values():
-            frame.destroy()
-        self.app_widgets.clear()
-        for label in getattr(self, 'category_labels', {}).values():
-            label.destroy()
-        for btn in getattr(self, 'category_trash_icons', {}).values():
-            btn.destroy()
-        self.category_labels = {}
-        self.category_trash_icons = {}
-        # Display all categories as columns in a single horizontal row
-        categories = list(apps_by_category.keys())
+        # Recompute the layout from the catalog and refresh the visible part of the grid.
+        # Category headers are diffed like before; app rows are only materialized on screen.
+        query = self.search_var.get()
+        self.search_matches = self.search_index.search(query) if query.strip() else None
+        if self.search_matches is None:
+            self.columns = list(catalog.categories.items())
+        else:
+            matches = self.search_matches
+            self.columns = [(category, [i for i in ids if i in matches]) for category, ids in catalog.categories.items()]
+            self.columns = [column for column in self.columns if column[1]]
+        shown = {category for category, _ in self.columns}
         remove_mode = self.edit_mode.get() == 'remove'
-        edit_mode = self.edit_mode.get() == 'edit'
-        for col, category in enumerate(categories):
-            cat_frame = tk.Frame(self.scroll_frame, bg="#f4f4f4")
-            cat_frame.grid(row=0, column=col, padx=16, pady=(8, 16), sticky="nwe")
-            cat_label = tk.Label(cat_frame, text=category, font=("Helvetica", 14, "bold"), bg="#f4f4f4")
-            cat_label.pack(side="left")
-            self.category_labels[category] = cat_label
-            if remove_mode:
+        # Display all categories as columns in a single horizontal row
+        for col, (category, _) in enumerate(self.columns):
+            header = self.category_frames.get(category)
+            if header is None:
+                cat_frame = tk.Frame(self.canvas, bg="#f4f4f4")
+                cat_label = tk.Label(cat_frame, text=category, font=("Helvetica", 14, "bold"), bg="#f4f4f4")
+                cat_label.pack(side="left")
                 trash_btn = tk.Button(cat_frame, text="🗑️", command=lambda c=category: self.delete_category_gui(c), relief="flat", bg="#f4f4f4", bd=0, padx=2, cursor="hand2")
-                trash_btn.pack(side="left", padx=(6, 0))
+                item = self.canvas.create_window(0, 0, window=cat_frame, anchor="nw")
+                header = self.category_frames[category] = (cat_frame, item)
+                self.category_labels[category] = cat_label
                 self.category_trash_icons[category] = trash_btn
-        # Place apps under each category
-        for col, category in enumerate(categories):
-            apps = apps_by_category[category]
-            for row_offset, (name, data) in enumerate(apps.items()):
-                frame = self.add_app(name, data, parent=self.scroll_frame, grid_row=row_offset+1, grid_col=col, return_widget=True, category=category, show_remove=remove_mode)
-                self.app_widgets[(category, name)] = frame
+            self.canvas.coords(header[1], col * GRID_COLUMN_WIDTH + 16, 8)
+            self.canvas.itemconfigure(header[1], state="normal")
+            trash_btn = self.category_trash_icons[category]
+            if remove_mode and not trash_btn.winfo_manager():
+                trash_btn.pack(side="left", padx=(6, 0))
+            elif not remove_mode:
+                trash_btn.pack_forget()
+        for category in [c for c in self.category_frames if c not in catalog.categories]:
+            cat_frame, item = self.category_frames.pop(category)
+            self.canvas.delete(item)
+            cat_frame.destroy()
+            self.category_labels.pop(category, None)
+            self.category_trash_icons.pop(category, None)
+        # Categories with no search hits keep their header, just hidden
+        for category, (cat_frame, item) in self.category_frames.items():
+            if category not in shown:
+                self.canvas.itemconfigure(item, state="hidden")
+        longest = max((len(apps) for _, apps in self.columns), default=0)
+        self.canvas.configure(scrollregion=(0, 0, len(self.columns) * GRID_COLUMN_WIDTH, GRID_HEADER_HEIGHT + longest * GRID_ROW_HEIGHT))
+        self.refresh_viewport()
+
+    def schedule_search(self, event=None):
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DEBOUNCE_MS, self.apply_search)
+
+    def apply_search(self):
+        self.search_job = None
+        query = self.search_var.get()
+        matches = self.search_index.search(query) if query.strip() else None
+        if matches == self.search_matches:
+            return
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.render_app_grid()
+
+    def schedule_viewport_refresh(self):
+        # Coalesce scroll/resize bursts into one refresh per idle cycle
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.root.after_idle(self.refresh_viewport)
+
+    def refresh_viewport(self):
+        # Bind row widgets to the apps in (or just outside) the visible area.
+        # Rows that scrolled out go back to the pool; rows still showing the same app stay put.
+        self.refresh_pending = False
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        first_col = max(0, int(left // GRID_COLUMN_WIDTH))
+        last_col = min(len(self.columns) - 1, int((left + width) // GRID_COLUMN_WIDTH))
+        first_row = max(0, int((top - GRID_HEADER_HEIGHT) // GRID_ROW_HEIGHT) - GRID_OVERSCAN)
+        last_row = int((top + height - GRID_HEADER_HEIGHT) // GRID_ROW_HEIGHT) + GRID_OVERSCAN
+        wanted = {}  # app_id: (entry, x, y)
+        for col in range(first_col, last_col + 1):
+            category, ids = self.columns[col]
+            for row_index in range(first_row, min(last_row + 1, len(ids))):
+                entry = catalog.get(ids[row_index])
+                wanted[entry["id"]] = (entry, col * GRID_COLUMN_WIDTH + 8, GRID_HEADER_HEIGHT + row_index * GRID_ROW_HEIGHT)
+        for app_id in [i for i, row in self.visible_rows.items() if i not in wanted or row["data"] is not wanted[i][0]["data"]]:
+            self.release_row(self.visible_rows.pop(app_id))
+        remove_mode = self.edit_mode.get() == 'remove'
+        for app_id, (entry, x, y) in wanted.items():
+            row = self.visible_rows.get(app_id)
+            if row is None:
+                row = self.row_pool.pop() if self.row_pool else self.create_row()
+                self.bind_row(row, entry)
+                self.visible_rows[app_id] = row
+            if row["pos"] != (x, y):
+                self.canvas.coords(row["item"], x, y)
+                row["pos"] = (x, y)
+            if row["remove_shown"] != remove_mode:
+                if remove_mode:
+                    row["remove_btn"].grid()
+                else:
+                    row["remove_btn"].grid_remove()
+                row["remove_shown"] = remove_mode
+            if row["hidden"]:
+                self.canvas.itemconfigure(row["item"], state="normal")
+                row["hidden"] = False
+
+    def create_row(self):
+        # One reusable app row: checkbox, icon, name, trash button and a progress line
+        frame = ttk.Frame(self.canvas)
+        row = {"frame": frame, "key": None, "data": None, "pos": None, "hidden": True, "remove_shown": True}
+        row["var"] = tk.BooleanVar()
+        check = ttk.Checkbutton(frame, variable=row["var"], command=lambda: self.set_selected(row["key"], row["var"].get()))
+        check.grid(row=0, column=0, padx=(0, 2), sticky="w")
+        row["icon_label"] = tk.Label(frame, image=self.blank_icon)
+        row["icon_label"].grid(row=0, column=1, padx=(0, 2), sticky="w")
+        row["name_label"] = tk.Label(frame, text="", anchor="w", justify="left", width=18, cursor="hand2")
+        row["name_label"].grid(row=0, column=2, sticky="w")
+        row["name_label"].bind("<Button-1>", lambda e: self.set_selected(row["key"], not row["var"].get()))
+        row["remove_btn"] = tk.Button(frame, text="🗑️", command=lambda: self.remove_app(row["key"]), relief="flat", bg="#f4f4f4", bd=0, padx=2, cursor="hand2")
+        row["remove_btn"].grid(row=0, column=3, padx=(4, 0), sticky="ns")
+        # Download progress (hidden until this app is being downloaded)
+        row["bar"] = ttk.Progressbar(frame, length=70, mode="determinate", maximum=100)
+        row["bar"].grid(row=1, column=0, columnspan=2, padx=(0, 4), sticky="we")
+        row["status"] = tk.Label(frame, text="", font=("Helvetica", 8), fg="#444444", anchor="w")
+        row["status"].grid(row=1, column=2, columnspan=2, sticky="w")
+        row["item"] = self.canvas.create_window(0, 0, window=frame, anchor="nw", state="hidden")
+        return row
+
+    def bind_row(self, row, entry):
+        row["key"] = entry["id"]
+        row["data"] = entry["data"]
+        row["var"].set(entry["id"] in self.selected)
+        found, image = self.icons.peek(entry["data"].get("icon"))
+        row["icon_label"].config(image=image or self.blank_icon)
+        if not found:
+            self.icon_backlog.append(entry["id"])
+            if self.icon_job is None:
+                self.icon_job = self.root.after_idle(self.load_icons)
+        row["name_label"].config(text=entry["name"])
+        self.show_progress(row)
+
+    def load_icons(self):
+        # Fill in icons for rows still showing the blank one, a few at a time between frames
+        self.icon_job = None
+        deadline = time.perf_counter() + ICON_LOAD_BUDGET
+        while self.icon_backlog and time.perf_counter() < deadline:
+            row = self.visible_rows.get(self.icon_backlog.pop())
+            if row and row["data"] is not None:
+                row["icon_label"].config(image=self.icons.get(row["data"].get("icon")) or self.blank_icon)
+        if self.icon_backlog:
+            self.icon_job = self.root.after(1, self.load_icons)
+
+    def release_row(self, row):
+        self.canvas.itemconfigure(row["item"], state="hidden")
+        row["hidden"] = True
+        row["key"] = None
+        row["data"] = None
+        self.row_pool.append(row)
+
+    def set_selected(self, app_id, checked):
+        if app_id is None:
+            return
+        if checked:
+            self.selected.add(app_id)
+        else:
+            self.selected.discard(app_id)
+        row = self.visible_rows.get(app_id)
+        if row:
+            row["var"].set(checked)
+        if checked:
+            self.prefetch_info(app_id)
+
+    def prefetch_info(self, app_id):
+        # Resolve a checked app's URL in the background, so Install Selected can start its
+        # download right away and the grid can show its size and file type
+        entry = catalog.get(app_id)
+        url = entry and (mirror_list(entry["data"]["url"]) or [None])[0]
+        if not url or self.metadata.fresh(url):
+            return
+        self.engine.prefetch(url).add_done_callback(lambda future: self.events.put(("metadata", app_id, None)))
+
+    def remove_app(self, app_id):
+        entry = catalog.get(app_id)
+        if entry:
+            catalog.remove(app_id)
+            self.selected.discard(app_id)
+            self.render_app_grid()
+            self.save_json()
+            self.show_notification(f"Removed {entry['name']} from {entry['category']}.")
 
     def add_custom_app(self):
         name = self.custom_app_fields["name"].get().strip()
         icon = self.custom_app_fields["icon"].get().strip()
-        url = self.custom_app_fields["url"].get().strip()
+        url = parse_urls(self.custom_app_fields["url"].get())
         category = self.custom_app_fields["category"].get().strip() or "Other"
         if not name or not icon or not url:
             self.show_notification("Please fill in all fields.", error=True)
             return
-        # Add to apps_by_category
-        if category not in apps_by_category:
-            from collections import OrderedDict
-            apps_by_category[category] = OrderedDict()
-        apps_by_category[category][name] = {"url": url, "icon": icon, "category": category}
+        catalog.add(name, {"url": url, "icon": icon, "category": category}, category)
         self.render_app_grid()
         self.save_json()
         self.show_notification(f"Added {name} to {category}.")
@@ -240,122 +3030,60 @@ class AppInstallerGUI:
             entry.delete(0, tk.END)
 
     def save_json(self):
-        # Save the current apps_by_category to apps.json
-        import json
-        # Rebuild the original structure for saving
-        out = {}
-        for cat, apps in apps_by_category.items():
-            for name, data in apps.items():
-                if cat not in out:
-                    out[cat] = {}
-                out[cat][name] = data
-        with open("apps.json", "w") as f:
-            json.dump(out, f, indent=2)
+        # Save the current catalog once edits have been quiet for SAVE_DELAY_MS
+        if self.save_job:
+            self.root.after_cancel(self.save_job)
+        self.save_job = self.root.after(SAVE_DELAY_MS, self.write_catalog)
+
+    def write_catalog(self):
+        self.save_job = None
+        try:
+            self.store.save()
+        except OSError as e:
+            self.show_notification(f"Could not save apps.json: {e}", error=True)
 
     def revert_to_default_json(self):
-        import json
-        with open("apps.json", "w") as f:
-            f.write(self.default_json)
-        # Reload apps_by_category
-        global apps_by_category
-        with open("apps.json", "r") as f:
-            raw_json = json.load(f)
-        from collections import defaultdict, OrderedDict
-        apps_by_category = defaultdict(dict)
-        category_order = []
-        for top_level in raw_json.values():
-            for app_name, app_data in top_level.items():
-                cat = app_data.get("category", "Other")
-                if cat not in apps_by_category:
-                    category_order.append(cat)
-                apps_by_category[cat][app_name] = app_data
-        apps_by_category = OrderedDict((cat, OrderedDict(sorted(apps.items()))) for cat, apps in apps_by_category.items() if cat in category_order)
-        if 'Other' in category_order:
-            category_order = [c for c in category_order if c != 'Other'] + ['Other']
-        apps_by_category = OrderedDict((cat, apps_by_category[cat]) for cat in category_order if cat in apps_by_category)
+        # Reload the catalog in place and write the original text back right away
+        catalog.reset(json.loads(self.default_json))
+        self.store.write(self.default_json)
+        self.selected.clear()
         self.render_app_grid()
         self.show_notification("Reverted to default app list.")
 
-    def add_app(self, name, data, parent=None, grid_row=None, grid_col=None, return_widget=False, category=None, show_remove=False):
-        if parent is None:
-            parent = self.scroll_frame
-        frame = ttk.Frame(parent)
-        if grid_row is not None and grid_col is not None:
-            frame.grid(row=grid_row, column=grid_col, padx=8, pady=4, sticky="nsew")
-        else:
-            frame.pack(fill="x", pady=5)
-
-        try:
-            img = Image.open(os.path.join("icons", data["icon"]))
-            img = img.resize((20, 20), Image.LANCZOS)
-            icon = ImageTk.PhotoImage(img)
-        except Exception as e:
-            print(f"Failed to load icon for {name}: {e}")
-            icon = None
-
-        var = self.check_vars.get(name) or tk.BooleanVar()
-        self.check_vars[name] = var
-
-        check = ttk.Checkbutton(frame, variable=var)
-        check.grid(row=0, column=0, padx=(0, 2), sticky="w")
-
-        if icon:
-            icon_label = tk.Label(frame, image=icon)
-            icon_label.image = icon
-            icon_label.grid(row=0, column=1, padx=(0, 2), sticky="w")
-        else:
-            icon_label = tk.Label(frame, width=20)
-            icon_label.grid(row=0, column=1, padx=(0, 2), sticky="w")
-
-        def toggle_var(event=None, v=var):
-            v.set(not v.get())
-        name_label = tk.Label(frame, text=name, anchor="w", justify="left", width=18, cursor="hand2")
-        name_label.grid(row=0, column=2, sticky="w")
-        name_label.bind("<Button-1>", toggle_var)
-
-        col_idx = 3
-        if show_remove:
-            def remove_app():
-                if category and name in apps_by_category.get(category, {}):
-                    del apps_by_category[category][name]
-                    if not apps_by_category[category]:
-                        del apps_by_category[category]
-                    self.render_app_grid()
-                    self.save_json()
-                    self.show_notification(f"Removed {name} from {category}.")
-            remove_btn = tk.Button(frame, text="🗑️", command=remove_app, relief="flat", bg="#f4f4f4", bd=0, padx=2, cursor="hand2")
-            remove_btn.grid(row=0, column=col_idx, padx=(4, 0), sticky="ns")
-
-        if return_widget:
-            return frame
-
     def install_selected(self):
-        selected = [name for name, var in self.check_vars.items() if var.get()]
+        selected = [entry["id"] for entry in catalog if entry["id"] in self.selected]
         if not selected:
             self.show_notification("Please select at least one app to install.", error=True)
             return
-
-        mode = self.install_mode.get()
-        if mode == "skip":
-            # Just download installers, do not run them
-            for app_name in selected:
-                self.download_and_install(app_name, run_installer=False)
-            self.show_notification("Installers downloaded. Opening folder...")
-            import subprocess, os
-            subprocess.Popen(f'explorer "{os.path.abspath("installers")}"')
+        if self.batch or any(d["status"] in ("queued", "downloading") for d in self.downloads.values()):
+            self.show_notification("Downloads are already running.", error=True)
             return
 
+        if not self.apply_download_settings():
+            return
+        mode = self.install_mode.get()
+        self.telemetry.begin_run()
         if mode == "manual":
             self.pending_apps = selected
             self.current_app_index = 0
-            self.show_notification(f"Ready to install: {self.pending_apps[self.current_app_index]}")
+            # Fetch every installer in the background, in step order, so Next App can start each one right away
+            for index, app_id in enumerate(selected):
+                self.download_and_install(app_id, run_installer=False, prefetch=True, priority=len(selected) - index)
+            self.show_notification(f"Ready to install: {self.app_name(self.pending_apps[self.current_app_index])}")
             self.install_next_manual()
             return
 
-        # Default: download and install all
-        for app_name in selected:
-            self.download_and_install(app_name)
-        self.show_notification("All selected apps have been installed.")
+        # Auto: download all in parallel and run the installers one after another as they land,
+        # so installing overlaps the rest of the downloads.
+        # Skip: download all in parallel, then open the folder.
+        self.batch = {"mode": mode, "remaining": set(selected), "failed": []}
+        for app_id in selected:
+            self.download_and_install(app_id, run_installer=(mode == "auto"))
+        self.show_notification(f"Downloading {len(selected)} app(s)...")
+
+    def app_name(self, app_id):
+        entry = catalog.get(app_id)
+        return entry["name"] if entry else str(app_id)
 
     def install_next_manual(self):
         if self.current_app_index >= len(self.pending_apps):
@@ -364,52 +3092,262 @@ class AppInstallerGUI:
                 self.next_button.destroy()
                 self.next_button = None
             return
-        app_name = self.pending_apps[self.current_app_index]
-        self.download_and_install(app_name, after_manual=True)
+        app_id = self.pending_apps[self.current_app_index]
+        if self.next_button:
+            self.next_button.config(state="disabled")
+        state = self.downloads.get(app_id)
+        if not state or not state["prefetch"] or state["status"] == "error":
+            self.download_and_install(app_id, after_manual=True)  # not prefetched, or the prefetch failed
+            return
+        state["prefetch"] = False
+        state["run_installer"] = state["after_manual"] = True
+        if state["status"] == "done":
+            self.start_install(app_id)
+        # otherwise it is still downloading and finish_download starts the installer
 
     def after_manual_install(self):
         self.current_app_index += 1
         if self.current_app_index < len(self.pending_apps):
-            self.show_notification(f"Ready to install: {self.pending_apps[self.current_app_index]}")
+            self.show_notification(f"Ready to install: {self.app_name(self.pending_apps[self.current_app_index])}")
             if not self.next_button:
                 self.next_button = ttk.Button(self.next_button_frame, text="Next App", command=self.install_next_manual)
                 self.next_button.pack(pady=10)
+            self.next_button.config(state="normal")
         else:
             self.show_notification("All selected apps have been installed.")
             if self.next_button:
                 self.next_button.destroy()
                 self.next_button = None
 
-    def download_and_install(self, app_name, run_installer=True, after_manual=False):
-        # Find the app data by searching all categories
-        data = None
-        for apps in apps_by_category.values():
-            if app_name in apps:
-                data = apps[app_name]
-                break
-        if not data:
-            self.show_notification(f"App data not found for {app_name}", error=True)
+    def download_and_install(self, app_id, run_installer=True, after_manual=False, prefetch=False, priority=None):
+        # Starts the download in the background; finish_download picks it up when done.
+        # A prefetch only downloads and waits for install_next_manual to claim it.
+        entry = catalog.get(app_id)
+        if not entry:
+            self.show_notification(f"App data not found for {self.app_name(app_id)}", error=True)
+            self.download_finished(app_id, failed=True)
             return
-        url = data["url"]
-        path = os.path.join("installers", f"{app_name}.exe")
+        app_name = catalog.label(app_id)
+        url = entry["data"]["url"]
+        path = installer_path("installers", app_name, url, self.metadata)
+        trace = self.telemetry.start(app_name, (mirror_list(url) or [""])[0])
+        self.downloads[app_id] = {"name": app_name, "run_installer": run_installer, "after_manual": after_manual, "prefetch": prefetch,
+                                  "status": "queued", "progress": None, "path": None, "trace": trace}
+        self.update_progress_row(app_id)
+        print(f"Downloading {app_name}...")
+        self.engine.submit(app_id, url, path, lambda *event: self.events.put(event), key=app_name, checks=expected_checks(entry["data"]), trace=trace,
+                           priority=download_priority(entry["data"]) if priority is None else priority,
+                           prepare=partial(unpack_installer, app_data=entry["data"], trace=trace))
 
+    def poll_events(self):
+        # Drain worker events on the Tk thread. Progress events are coalesced per app and
+        # the loop stops after a small time budget so a burst never stalls a frame.
+        deadline = time.monotonic() + EVENT_BUDGET
+        touched = set()
         try:
-            print(f"Downloading {app_name}...")
-            with requests.get(url, stream=True) as r:
-                r.raise_for_status()
-                with open(path, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            if run_installer:
-                print(f"Installing {app_name}...")
-                run_as_admin(path)
-            if after_manual:
-                self.after_manual_install()
-        except Exception as e:
-            self.show_notification(f"Failed to install {app_name}: {e}", error=True)
-            if after_manual and self.next_button:
+            while time.monotonic() < deadline:
+                kind, app_id, payload = self.events.get_nowait()
+                if kind == "verified":
+                    self.show_verify_results(payload)
+                    continue
+                if kind == "metadata":
+                    touched.add(app_id)
+                    continue
+                state = self.downloads.get(app_id)
+                if state is None:
+                    continue
+                if kind == "start":
+                    state["status"] = "downloading"
+                elif kind == "progress":
+                    state["progress"] = payload
+                elif kind == "done":
+                    state["status"] = "done"
+                    self.finish_download(app_id, payload)
+                elif kind == "error":
+                    state["status"] = "error"
+                    state["error"] = payload
+                    self.finish_download(app_id, None, error=payload)
+                elif kind == "installing":
+                    state["status"] = "installing"
+                elif kind == "installed":
+                    state["status"] = "installed"
+                    self.finish_install(app_id)
+                elif kind == "install_failed":
+                    state["status"] = "error"
+                    state["error"] = payload
+                    self.finish_install(app_id, error=payload)
+                touched.add(app_id)
+        except queue.Empty:
+            pass
+        for app_id in touched:
+            self.update_progress_row(app_id)
+        self.root.after(EVENT_POLL_MS, self.poll_events)
+
+    def finish_download(self, app_id, path, error=None):
+        state = self.downloads[app_id]
+        app_name = state["name"]
+        if error:
+            print(f"Failed to download {app_name}: {error}")
+            if state["prefetch"]:
+                return  # install_next_manual downloads it again when the user gets there
+            self.telemetry.finish(state["trace"], "failed", error)
+            self.update_last_run()
+            self.show_notification(f"Failed to install {app_name}: {error}", error=True)
+            if state["after_manual"] and self.next_button:
                 self.next_button.destroy()
                 self.next_button = None
+            self.download_finished(app_id, failed=True)
+            return
+        state["path"] = path
+        if state["run_installer"]:
+            self.start_install(app_id)
+        elif not state["prefetch"]:
+            self.telemetry.finish(state["trace"])
+            self.update_last_run()
+            self.download_finished(app_id)
+
+    def start_install(self, app_id):
+        # Queue the downloaded installer; installs run one at a time on a background thread
+        # (two installers at once tend to fail on the Windows Installer lock) while the
+        # remaining downloads carry on. The result comes back through poll_events.
+        state = self.downloads[app_id]
+        state["status"] = "waiting"
+        self.update_progress_row(app_id)
+        if self.install_pool is None:
+            self.install_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="install")
+
+        def job():
+            self.events.put(("installing", app_id, None))
+            print(f"Installing {state['name']}...")
+            try:
+                with state["trace"].phase("install"):
+                    install_app(state["path"])
+            except Exception as e:
+                self.events.put(("install_failed", app_id, str(e)))
+                return
+            self.events.put(("installed", app_id, None))
+        self.install_pool.submit(job)
+
+    def finish_install(self, app_id, error=None):
+        state = self.downloads[app_id]
+        if error:
+            print(f"Failed to install {state['name']}: {error}")
+            self.show_notification(f"Failed to install {state['name']}: {error}", error=True)
+            self.telemetry.finish(state["trace"], "failed", error)
+        else:
+            self.telemetry.finish(state["trace"])
+        self.update_last_run()
+        if state["after_manual"]:
+            self.after_manual_install()  # a failed installer doesn't stop the step-through
+        self.download_finished(app_id, failed=bool(error))
+
+    def download_finished(self, app_id, failed=False):
+        batch = self.batch
+        if not batch or app_id not in batch["remaining"]:
+            return
+        batch["remaining"].discard(app_id)
+        if failed:
+            batch["failed"].append(self.app_name(app_id))
+        if batch["remaining"]:
+            return
+        self.batch = None
+        if batch["mode"] == "skip":
+            if batch["failed"]:
+                self.show_notification(f"Failed to download: {', '.join(batch['failed'])}", error=True)
+            else:
+                self.show_notification("Installers downloaded. Opening folder...")
+            import subprocess, os
+            subprocess.Popen(f'explorer "{os.path.abspath("installers")}"')
+        elif batch["failed"]:
+            self.show_notification(f"Failed to install: {', '.join(batch['failed'])}", error=True)
+        else:
+            self.show_notification("All selected apps have been installed.")
+
+    def update_last_run(self):
+        self.last_run_label.config(text=summarize_run(self.telemetry.last_run))
+        if not self.last_run_frame.winfo_manager():
+            self.last_run_frame.pack(side="bottom", fill="x", padx=10, pady=(0, 4))
+
+    def verify_downloads(self):
+        # Hash everything in installers/ on a background thread; results come back through poll_events
+        self.verify_button.config(state="disabled")
+        self.show_notification("Verifying downloaded installers...")
+        cache = self.engine.cache
+
+        def work():
+            try:
+                results = verify_installers(cache, catalog)
+            except Exception as e:
+                results = e
+            self.events.put(("verified", None, results))
+        threading.Thread(target=work, daemon=True).start()
+
+    def show_verify_results(self, results):
+        self.verify_button.config(state="normal")
+        if isinstance(results, Exception):
+            self.show_notification(f"Verification failed: {results}", error=True)
+            return
+        bad = [os.path.basename(r["path"]) for r in results if r["status"] == "mismatch"]
+        checked = sum(r["status"] != "unchecked" for r in results)
+        if bad:
+            self.show_notification(f"{len(bad)} installer(s) failed verification and will be downloaded again: {', '.join(bad)}", error=True)
+        else:
+            self.show_notification(f"Verified {checked} of {len(results)} installers, no problems found.")
+
+    def update_progress_row(self, app_id):
+        row = self.visible_rows.get(app_id)
+        if row:
+            self.show_progress(row)
+
+    def show_progress(self, row):
+        bar, label = row["bar"], row["status"]
+        state = self.downloads.get(row["key"])
+        if not state:
+            if row.get("progress_shown", True):
+                bar.grid_remove()
+                row["progress_shown"] = False
+            # Size and file type, once the app's URL has been looked up
+            url = (mirror_list(row["data"]["url"]) or [None])[0] if row["data"] else None
+            info = url and self.metadata.get(url)
+            if info:
+                size = format_size(info["size"]) + " · " if info["size"] else ""
+                label.config(text=size + installer_extension(url, info), fg="#888888")
+                label.grid()
+            else:
+                label.grid_remove()
+            return
+        if not row.get("progress_shown"):
+            bar.grid()
+            label.grid()
+            row["progress_shown"] = True
+        status = state["status"]
+        if status == "queued":
+            bar.config(value=0)
+            label.config(text="Queued", fg="#444444")
+        elif status == "downloading":
+            done, total, rate, eta = state["progress"] or (0, 0, 0.0, None)
+            if total:
+                bar.config(value=100 * done / total)
+                text = f"{100 * done // total}% · {format_size(rate)}/s · ETA {format_eta(eta)}"
+            else:
+                bar.config(value=0)
+                text = f"{format_size(done)} · {format_size(rate)}/s"
+            label.config(text=text, fg="#444444")
+        elif status == "done":
+            bar.config(value=100)
+            label.config(text="Downloaded", fg="green")
+        elif status == "waiting":
+            bar.config(value=100)
+            label.config(text="Waiting to install", fg="#444444")
+        elif status == "installing":
+            bar.config(value=100)
+            label.config(text="Installing...", fg="#444444")
+        elif status == "installed":
+            bar.config(value=100)
+            label.config(text="Installed", fg="green")
+        elif status == "error":
+            bar.config(value=0)
+            label.config(text="Failed", fg="red")
 
     def show_notification(self, message, error=False):
         self.notification_label.config(text=message, fg="red" if error else "green")
@@ -418,11 +3356,11 @@ class AppInstallerGUI:
     def update_mode_explanation(self):
         mode = self.install_mode.get()
         if mode == "auto":
-            text = "Auto Install (unsafe): Downloads and installs all selected apps automatically at the same time. You may not see installer windows."
+            text = "Auto Install (unsafe): Downloads all selected apps at the same time and runs their installers one after another as they arrive. You may not see installer windows."
         elif mode == "skip":
             text = "Skip Auto Install: Only downloads the installers and opens the folder. You install them manually."
         elif mode == "manual":
-            text = "Manual Step-Through: Installs one app at a time. After each, click 'Next App' to continue."
+            text = "Manual Step-Through: Installs one app at a time while the next ones download. After each, click 'Next App' to continue."
         else:
             text = ""
         self.mode_explanation.config(text=text)
@@ -436,6 +3374,14 @@ class AppInstallerGUI:
             self.disclaimer.pack_forget()
         self.render_app_grid()
 
+    def update_name_completions(self):
+        name_entry = self.custom_app_fields["name"]
+        name_entry.configure(values=self.search_index.complete(name_entry.get().strip()))
+
+    def on_name_typed(self, event=None):
+        self.update_name_completions()
+        self.update_edit_fields(event)
+
     def update_edit_fields(self, event=None):
         mode = self.edit_mode.get()
         name = self.custom_app_fields["name"].get().strip()
@@ -443,36 +3389,13 @@ class AppInstallerGUI:
         url_entry = self.custom_app_fields["url"]
         cat_combo = self.custom_app_fields["category"]
         # Only autofill in edit/remove mode if name matches, and don't clear fields in other cases
-        found = None
-        for cat, apps in apps_by_category.items():
-            if name in apps:
-                found = (cat, apps[name])
-                break
+        found = catalog.find_label(name)
         # Icon preview (next to name)
-        icon_path = None
-        if found:
-            icon_file = found[1].get("icon")
-            if icon_file:
-                icon_path = os.path.join("icons", icon_file)
-        if icon_path and os.path.exists(icon_path):
-            from PIL import Image, ImageTk
-            img = Image.open(icon_path)
-            img = img.resize((20, 20), Image.LANCZOS)
-            self.icon_preview_img = ImageTk.PhotoImage(img)
-            self.icon_preview.config(image=self.icon_preview_img)
-        else:
-            self.icon_preview.config(image="")
+        self.icon_preview_img = self.icons.get(found["data"].get("icon")) if found else None
+        self.icon_preview.config(image=self.icon_preview_img or "")
         # Icon preview (next to icon field)
-        icon_field_val = icon_entry.get().strip()
-        icon_field_path = os.path.join("icons", icon_field_val) if icon_field_val else None
-        if icon_field_path and os.path.exists(icon_field_path):
-            from PIL import Image, ImageTk
-            img = Image.open(icon_field_path)
-            img = img.resize((20, 20), Image.LANCZOS)
-            self.icon_preview_img2 = ImageTk.PhotoImage(img)
-            self.icon_field_preview.config(image=self.icon_preview_img2)
-        else:
-            self.icon_field_preview.config(image="")
+        self.icon_preview_img2 = self.icons.get(icon_entry.get().strip())
+        self.icon_field_preview.config(image=self.icon_preview_img2 or "")
         if mode == "add":
             icon_entry.config(state="normal")
             url_entry.config(state="normal")
@@ -485,11 +3408,11 @@ class AppInstallerGUI:
             cat_combo.config(state="readonly")
             if found:
                 icon_entry.delete(0, tk.END)
-                icon_entry.insert(0, found[1].get("icon", ""))
+                icon_entry.insert(0, found["data"].get("icon", ""))
                 url_entry.delete(0, tk.END)
-                url_entry.insert(0, found[1].get("url", ""))
+                url_entry.insert(0, format_urls(found["data"].get("url", "")))
                 self.update_category_combo()
-                self.cat_var.set(found[0])
+                self.cat_var.set(found["category"])
         elif mode == "remove":
             icon_entry.config(state="disabled")
             url_entry.config(state="disabled")
@@ -497,21 +3420,21 @@ class AppInstallerGUI:
             if found:
                 icon_entry.config(state="normal")
                 icon_entry.delete(0, tk.END)
-                icon_entry.insert(0, found[1].get("icon", ""))
+                icon_entry.insert(0, found["data"].get("icon", ""))
                 icon_entry.config(state="disabled")
                 url_entry.config(state="normal")
                 url_entry.delete(0, tk.END)
-                url_entry.insert(0, found[1].get("url", ""))
+                url_entry.insert(0, format_urls(found["data"].get("url", "")))
                 url_entry.config(state="disabled")
                 self.update_category_combo()
-                self.cat_var.set(found[0])
+                self.cat_var.set(found["category"])
                 cat_combo.config(state="disabled")
 
     def handle_edit_submit(self):
         mode = self.edit_mode.get()
         name = self.custom_app_fields["name"].get().strip()
         icon = self.custom_app_fields["icon"].get().strip()
-        url = self.custom_app_fields["url"].get().strip()
+        url = parse_urls(self.custom_app_fields["url"].get())
         category = self.cat_var.get().strip() or "Other"
         if not name:
             self.show_notification("Please enter a name.", error=True)
@@ -520,49 +3443,39 @@ class AppInstallerGUI:
             if not icon or not url or not category:
                 self.show_notification("Please fill in all fields.", error=True)
                 return
-            if category not in apps_by_category:
-                from collections import OrderedDict
-                apps_by_category[category] = OrderedDict()
-            apps_by_category[category][name] = {"url": url, "icon": icon, "category": category}
+            catalog.add(name, {"url": url, "icon": icon, "category": category}, category)
             self.render_app_grid()
             self.save_json()
             self.show_notification(f"Added {name} to {category}.")
         elif mode == "edit":
-            found = None
-            for cat, apps in apps_by_category.items():
-                if name in apps:
-                    found = (cat, apps[name])
-                    break
+            found = catalog.find_label(name)
             if not found:
                 self.show_notification("App not found to edit.", error=True)
                 return
-            # Remove from old category if changed
-            if found[0] != category:
-                del apps_by_category[found[0]][name]
-                if not apps_by_category[found[0]]:
-                    del apps_by_category[found[0]]
-                if category not in apps_by_category:
-                    from collections import OrderedDict
-                    apps_by_category[category] = OrderedDict()
-            apps_by_category[category][name] = {"url": url, "icon": icon, "category": category}
+            if not url:
+                self.show_notification("Please enter a download URL.", error=True)
+                return
+            # Keeps the fields the form doesn't show (entry, priority, ...); sha256 and size
+            # describe the old download, so they go when the URL changes
+            data = dict(found["data"], url=url, icon=icon, category=category)
+            if url != found["data"].get("url"):
+                data.pop("sha256", None)
+                data.pop("size", None)
+            # Moves the app if the category changed
+            catalog.update(found["id"], data, category)
             self.render_app_grid()
             self.save_json()
             self.show_notification(f"Edited {name} in {category}.")
         elif mode == "remove":
-            found = None
-            for cat, apps in apps_by_category.items():
-                if name in apps:
-                    found = (cat, apps[name])
-                    break
+            found = catalog.find_label(name)
             if not found:
                 self.show_notification("App not found to remove.", error=True)
                 return
-            del apps_by_category[found[0]][name]
-            if not apps_by_category[found[0]]:
-                del apps_by_category[found[0]]
+            catalog.remove(found["id"])
+            self.selected.discard(found["id"])
             self.render_app_grid()
             self.save_json()
-            self.show_notification(f"Removed {name} from {found[0]}.")
+            self.show_notification(f"Removed {name} from {found['category']}.")
         # Clear fields after action
         self.custom_app_fields["name"].delete(0, tk.END)
         self.custom_app_fields["icon"].delete(0, tk.END)
@@ -586,32 +3499,21 @@ class AppInstallerGUI:
             self.custom_app_fields["icon"].insert(0, icon_name)
             self.icon_file_path = dest_path
             # Show a preview of the image next to the icon field
-            from PIL import Image, ImageTk
-            img = Image.open(dest_path)
-            img = img.resize((20, 20), Image.LANCZOS)
-            self.icon_preview_img = ImageTk.PhotoImage(img)
-            self.icon_preview.config(image=self.icon_preview_img)
+            self.icon_preview_img = self.icons.get(icon_name)
+            self.icon_preview.config(image=self.icon_preview_img or "")
 
     def add_new_category(self):
         import tkinter.simpledialog
         new_cat = tkinter.simpledialog.askstring("New Category", "Enter new category name:")
         if new_cat:
-            cats = list(apps_by_category.keys())
-            if new_cat not in cats:
-                apps_by_category[new_cat] = {}
+            catalog.add_category(new_cat)
             self.update_category_combo()
             self.cat_var.set(new_cat)
 
     def delete_category_gui(self, cat):
         # Move all apps to 'Uncategorized' instead of deleting them
         uncategorized = 'Uncategorized'
-        if uncategorized not in apps_by_category:
-            from collections import OrderedDict
-            apps_by_category[uncategorized] = OrderedDict()
-        for app_name, app_data in list(apps_by_category[cat].items()):
-            app_data['category'] = uncategorized
-            apps_by_category[uncategorized][app_name] = app_data
-        del apps_by_category[cat]
+        catalog.remove_category(cat, move_to=uncategorized)
         self.update_category_combo()
         self.cat_var.set(uncategorized)
         self.render_app_grid()
@@ -619,11 +3521,214 @@ class AppInstallerGUI:
         self.show_notification(f"Deleted category: {cat}. Apps moved to 'Uncategorized'.")
 
     def update_category_combo(self):
-        cats = list(apps_by_category.keys())
+        cats = catalog.category_names()
         self.cat_combo["values"] = cats
 
-if __name__ == "__main__":
+def run_gui():
+    load_tk()
+    load_catalog()
     root = tk.Tk()
     root.iconbitmap("boreicon.ico")
     app = AppInstallerGUI(root)
     root.mainloop()
+    return 0
+
+# Headless mode: python BoresAppInstaller.py install --profile dev-workstation.txt --mode skip --jobs 8
+# Progress goes to stdout as one JSON object per line; human-readable logs go to stderr.
+# Exit codes: 0 everything succeeded, 1 some apps failed or the run hit an I/O error,
+# 2 bad arguments, unknown apps or an unreadable profile/catalog.
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+CLI_PROGRESS_INTERVAL = 1.0  # seconds between progress lines per app
+
+class UsageError(Exception):
+    # A file named on the command line (--profile, --catalog) can't be read; exits with EXIT_USAGE,
+    # while other I/O errors are failures of the run itself (EXIT_FAILED)
+    pass
+
+def read_profile(path):
+    # One app name per line; blank lines and lines starting with # are ignored
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+    except (OSError, ValueError) as e:
+        raise UsageError(f"can't read profile {path}: {e}") from e
+
+def load_cli_catalog(path):
+    try:
+        return Catalog.load(path)
+    except (OSError, ValueError) as e:
+        raise UsageError(f"can't load catalog {path}: {e}") from e
+
+class JsonLineWriter:
+    # Thread-safe writer for the machine-readable event stream
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def __call__(self, event, **fields):
+        line = json.dumps({"event": event, "time": round(time.time(), 3), **fields})
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+def cli_install(args, emit):
+    app_catalog = load_cli_catalog(args.catalog)
+    names = list(args.apps)
+    if args.profile:
+        names = read_profile(args.profile) + names
+    if not names:
+        emit("error", error="no apps given (use --profile and/or --app)")
+        return EXIT_USAGE
+    entries = []
+    for name in dict.fromkeys(names):  # keep order, drop duplicates
+        entry = app_catalog.find_label(name)
+        if not entry:
+            emit("error", app=name, error="unknown app")
+            return EXIT_USAGE
+        if entry not in entries:
+            entries.append(entry)
+    labels = {entry["id"]: app_catalog.label(entry["id"]) for entry in entries}  # unique, unlike names
+    engine = DownloadEngine(workers=args.jobs, cache=InstallerCache(cache_index_path(args.dir)), order=args.order, bandwidth=(args.limit or 0) * 1024 ** 2, mirrors=MirrorStats(),
+                            peers=PEERS + args.peers, discover=args.discover, metadata=MetadataCache())
+    # Resolve every URL at once first: that gives each installer its real file type, and the
+    # downloads then go straight to the final hosts over already open connections
+    wait([engine.prefetch(e["data"]["url"]) for e in entries if mirror_list(e["data"]["url"])], timeout=SIZE_PROBE_WAIT)
+    jobs = [(labels[e["id"]], e["data"]["url"], installer_path(args.dir, labels[e["id"]], e["data"]["url"], engine.metadata), expected_checks(e["data"])) for e in entries]
+    priorities = {labels[e["id"]]: download_priority(e["data"]) for e in entries}
+    app_data = {labels[e["id"]]: e["data"] for e in entries}
+    telemetry = Telemetry(prometheus_path=args.metrics_file or PROMETHEUS_TEXTFILE)
+    telemetry.begin_run()
+    traces = {app_name: telemetry.start(app_name, (mirror_list(url) or [""])[0]) for app_name, url, *_ in jobs}
+    last_report = {}
+
+    def progress(app_name, done, total, rate, eta):
+        now = time.monotonic()
+        if now - last_report.get(app_name, 0) >= CLI_PROGRESS_INTERVAL:
+            last_report[app_name] = now
+            emit("progress", app=app_name, done=done, total=total, rate=round(rate), eta=None if eta is None else round(eta, 1))
+
+    started = time.monotonic()
+    ok, failed = [], []
+    for app_name, *_ in jobs:
+        emit("queued", app=app_name)
+    for app_name, path, error in engine.download_many(jobs, progress=progress, traces=traces, priorities=priorities):
+        trace = traces[app_name]
+        if error:
+            emit("failed", app=app_name, stage="download", error=str(error))
+            emit("timing", **telemetry.finish(trace, "failed", str(error)))
+            failed.append(app_name)
+            continue
+        emit("downloaded", app=app_name, path=path, bytes=os.path.getsize(path))
+        try:
+            unpacked = unpack_installer(path, app_data[app_name], trace)
+        except Exception as e:
+            emit("failed", app=app_name, stage="extract", error=str(e))
+            emit("timing", **telemetry.finish(trace, "failed", str(e)))
+            failed.append(app_name)
+            continue
+        if unpacked != path:
+            emit("extracted", app=app_name, path=unpacked)
+            path = unpacked
+        if args.mode == "auto":
+            # Installers run one at a time here while the engine keeps downloading the rest
+            try:
+                with trace.phase("install"):
+                    install_app(path)
+                emit("installed", app=app_name)
+            except Exception as e:
+                emit("failed", app=app_name, stage="install", error=str(e))
+                emit("timing", **telemetry.finish(trace, "failed", str(e)))
+                failed.append(app_name)
+                continue
+        emit("timing", **telemetry.finish(trace))
+        ok.append(app_name)
+    engine.shutdown()
+    first_ready, _ = run_times(telemetry.last_run)
+    emit("summary", ok=ok, failed=failed, seconds=round(time.monotonic() - started, 3), first_ready=first_ready)
+    return EXIT_FAILED if failed else EXIT_OK
+
+def cli_verify(args, emit):
+    started = time.monotonic()
+    results = verify_installers(InstallerCache(cache_index_path(args.dir)), load_cli_catalog(args.catalog), directory=args.dir, workers=args.jobs)
+    for result in results:
+        emit("verified", **result)
+    counts = {status: sum(r["status"] == status for r in results) for status in ("ok", "mismatch", "unchecked")}
+    emit("summary", seconds=round(time.monotonic() - started, 3), **counts)
+    return EXIT_FAILED if counts["mismatch"] else EXIT_OK
+
+def cli_serve(args, emit):
+    # Share installers/ with other instances until interrupted
+    server = PeerServer(directory=args.dir, index_path=cache_index_path(args.dir), port=args.port, discovery=not args.no_discovery).start()
+    emit("serving", url=f"http://{server.httpd.server_address[0]}:{server.port}", port=server.port, discovery=server.discovery)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return EXIT_OK
+
+def cli_list(args, emit):
+    app_catalog = load_cli_catalog(args.catalog)
+    for entry in app_catalog:
+        emit("app", app=app_catalog.label(entry["id"]), category=entry["category"], url=entry["data"]["url"])
+    return EXIT_OK
+
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(prog="BoresAppInstaller", description="Bore's App Installer. Run without arguments to open the GUI.")
+    parser.add_argument("--catalog", default="apps.json", help="app list to use (default: apps.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    install = sub.add_parser("install", help="download (and optionally install) apps without the GUI")
+    install.add_argument("--profile", help="text file with one app name per line")
+    install.add_argument("--app", dest="apps", action="append", default=[], help="app name (repeatable)")
+    install.add_argument("--mode", choices=["auto", "skip"], default="skip", help="auto runs each installer, skip only downloads (default)")
+    install.add_argument("--jobs", type=int, default=DOWNLOAD_WORKERS, help="parallel downloads")
+    install.add_argument("--dir", default="installers", help="where installers are saved")
+    install.add_argument("--order", choices=list(DOWNLOAD_ORDERS), default=DOWNLOAD_ORDER, help="smallest downloads the smallest installers first (default), listed keeps the given order")
+    install.add_argument("--limit", type=float, default=BANDWIDTH_LIMIT / 1024 ** 2, help="bandwidth shared by all downloads in MB/s (default: no limit)")
+    install.add_argument("--metrics-file", help="also write the run's timings as a Prometheus textfile here")
+    install.add_argument("--peer", dest="peers", action="append", default=[], help="another instance's shared cache to try first, e.g. http://10.0.0.5:8731 (repeatable)")
+    install.add_argument("--discover", action="store_true", help="also look for sharing instances on the LAN (only for apps with a sha256 in apps.json)")
+    install.set_defaults(func=cli_install)
+    verify = sub.add_parser("verify", help="re-hash downloaded installers and check them against apps.json")
+    verify.add_argument("--dir", default="installers", help="where installers are saved")
+    verify.add_argument("--jobs", type=int, default=None, help="files hashed in parallel (default: one per core)")
+    verify.set_defaults(func=cli_verify)
+    serve = sub.add_parser("serve", help="share downloaded installers with other instances on the LAN")
+    serve.add_argument("--dir", default="installers", help="where installers are saved")
+    serve.add_argument("--port", type=int, default=PEER_PORT, help=f"HTTP port (default: {PEER_PORT})")
+    serve.add_argument("--no-discovery", action="store_true", help="don't answer LAN discovery broadcasts")
+    serve.set_defaults(func=cli_serve)
+    listing = sub.add_parser("list", help="print the app catalog")
+    listing.set_defaults(func=cli_list)
+    return parser
+
+def run_cli(argv):
+    import contextlib
+    args = build_parser().parse_args(argv)
+    emit = JsonLineWriter(sys.stdout)
+    # Keep stdout machine-readable: the download code's print() logging goes to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            return args.func(args, emit)
+        except BrokenPipeError:
+            return EXIT_FAILED  # whoever was reading the event stream went away
+        except UsageError as e:
+            emit("error", error=str(e))
+            return EXIT_USAGE
+        except (OSError, ValueError) as e:
+            emit("error", error=str(e))
+            return EXIT_FAILED
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        return run_gui()
+    return run_cli(argv)
+
+if __name__ == "__main__":
+    sys.exit(main())
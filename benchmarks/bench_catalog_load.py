@@ -0,0 +1,70 @@
+# Catalog load benchmark: synthetic apps.json files from 10 to 100,000 apps, loaded
+# by parsing the JSON every time vs. from the compiled apps.json.cache.
+#   python benchmarks/bench_catalog_load.py --sizes 10 1000 100000 --repeat 5
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import BoresAppInstaller as bai
+
+CATEGORIES = ["Web Browsers", "Media & Creativity", "File Tools", "Developer Tools", "Runtime Libraries", "Game Platforms", "Other"]
+
+def synthetic_catalog(count, icons=None, url=None):
+    # Same shape as apps.json, with apps listed out of order so grouping and sorting have work to do.
+    # icons: icon file names to cycle through; url: callable(i) giving each app's download URL
+    raw = {category: {} for category in CATEGORIES}
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        name = f"App {(i * 7919) % count:06d}"
+        raw[category][name] = {
+            "url": url(i) if url else f"https://downloads.example.com/{i}/setup.exe",
+            "icon": icons[i % len(icons)] if icons else f"app{i % 50}.png",
+            "category": category,
+        }
+    return raw
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'apps':>8}  {'file':>9}  {'json ms':>9}  {'build ms':>9}  {'cache ms':>9}  {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.sizes:
+            path = os.path.join(tmp, f"apps{count}.json")
+            with open(path, "w") as f:
+                json.dump(synthetic_catalog(count), f, indent=2)
+            cache_path = path + bai.CATALOG_CACHE_SUFFIX
+
+            json_time = best_of(args.repeat, lambda: bai.Catalog.load(path, cache=False))
+
+            def cold():
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
+                bai.Catalog.load(path)
+            build_time = best_of(args.repeat, cold)  # parse + write the cache
+
+            warm = bai.Catalog.load(path)
+            cache_time = best_of(args.repeat, lambda: bai.Catalog.load(path))
+            assert len(warm) == count and warm.to_json() == bai.Catalog.load(path, cache=False).to_json()
+
+            print(f"{count:>8}  {bai.format_size(os.path.getsize(path)):>9}  {json_time * 1000:>9.2f}  "
+                  f"{build_time * 1000:>9.2f}  {cache_time * 1000:>9.2f}  {json_time / cache_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Resume benchmark: the stand-in server drops the first connection for each file partway
+# through, the engine retries, and the rest must come from a Range resume rather than a restart.
+# Fails if the server sent more bytes than the file holds (anything re-downloaded is waste).
+#   python benchmarks/bench_resume.py --size-mb 16 --cut-mb 1 6 15
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+import BoresAppInstaller as bai
+from standin_server import StandinServer, synthetic_bytes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=16)
+    parser.add_argument("--cut-mb", type=float, nargs="+", default=[1, 6, 15], help="MB sent before the first connection drops")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    sha256 = hashlib.sha256(synthetic_bytes(0, size)).hexdigest()
+    print(f"{args.size_mb} MB, first connection dropped after the given MB")
+    print(f"{'cut MB':>8}  {'seconds':>8}  {'requests':>8}  {'served MB':>9}  {'wasted':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for cut_mb in args.cut_mb:
+            with StandinServer(size=size, cut_after=int(cut_mb * 1024 * 1024)) as server:
+                # One stream, so the retry has to pick up the .part where the cut left it
+                engine = bai.DownloadEngine(segments=1)
+                path = os.path.join(tmp, f"resume{cut_mb}.exe")
+                started = time.perf_counter()
+                engine.fetch(server.url, path)
+                seconds = time.perf_counter() - started
+                engine.shutdown()
+                wasted = server.bytes_sent - size
+                print(f"{cut_mb:>8}  {seconds:>8.2f}  {server.requests:>8}  {server.bytes_sent / 1024 / 1024:>9.1f}  {wasted:>8}")
+                with open(path, "rb") as f:
+                    assert hashlib.sha256(f.read()).hexdigest() == sha256, "resumed file is corrupt"
+                assert wasted == 0, f"{wasted} bytes were downloaded twice"
+                os.remove(path)
+
+if __name__ == "__main__":
+    main()
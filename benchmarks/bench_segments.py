@@ -0,0 +1,45 @@
+# Segmented download benchmark: one large file from a throttled local server,
+# fetched with 1, 2, 4 and 8 segments.
+#   python benchmarks/bench_segments.py --size-mb 32 --bandwidth-mb 8
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+import BoresAppInstaller as bai
+from standin_server import StandinServer
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--bandwidth-mb", type=float, default=8.0, help="per-connection cap in MB/s")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    results = {}
+    with StandinServer(size=size, bandwidth=args.bandwidth_mb * 1024 * 1024) as server, tempfile.TemporaryDirectory() as tmp:
+        for count in args.segments:
+            engine = bai.DownloadEngine(per_host=max(count, 1), segments=count, segment_threshold=1)
+            path = os.path.join(tmp, f"seg{count}.exe")
+            started = time.perf_counter()
+            engine.fetch(server.url, path)
+            results[count] = time.perf_counter() - started
+            assert os.path.getsize(path) == size
+            os.remove(path)
+            engine.shutdown()
+
+    base = results[args.segments[0]]
+    print(f"{args.size_mb} MB at {args.bandwidth_mb} MB/s per connection")
+    print(f"{'segments':>8}  {'seconds':>8}  {'MB/s':>8}  {'speedup':>8}")
+    for count, seconds in results.items():
+        print(f"{count:>8}  {seconds:>8.2f}  {args.size_mb / seconds:>8.1f}  {base / seconds:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
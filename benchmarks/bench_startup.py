@@ -0,0 +1,100 @@
+# Startup benchmark: how long a fresh process takes to import the module and to get
+# the main window on screen, with a budget that fails the run when startup regresses.
+#   python benchmarks/bench_startup.py --runs 5 --max-import-ms 100 --max-window-ms 1500
+# The window part needs a display; on Linux without one it runs under xvfb-run when
+# that is installed and is skipped otherwise. Exit code 1 means a budget was exceeded.
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import BoresAppInstaller
+print(time.perf_counter() - started)
+"""
+
+# Same steps as run_gui(), minus the .ico (Windows only) and mainloop running forever.
+# Prints "mapped" once the root window is on screen and "ready" once the grid and its icons are in.
+WINDOW_SCRIPT = """
+import BoresAppInstaller as bai
+bai.load_tk()
+bai.load_catalog()
+root = bai.tk.Tk()
+app = bai.AppInstallerGUI(root)
+def wait_ready():
+    if app.columns and app.icon_job is None:
+        print("ready", flush=True)
+        root.destroy()
+    else:
+        root.after(5, wait_ready)
+def on_map(event):
+    if event.widget is root and not getattr(root, "seen_map", False):
+        root.seen_map = True
+        print("mapped", flush=True)
+        root.after(5, wait_ready)
+root.bind("<Map>", on_map)
+root.mainloop()
+"""
+
+def measure_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def display_prefix():
+    # Command prefix that gives the child a display, or None when there is no way to get one
+    if sys.platform == "win32" or sys.platform == "darwin" or os.environ.get("DISPLAY"):
+        return []
+    if shutil.which("xvfb-run"):
+        return ["xvfb-run", "-a"]
+    return None
+
+def measure_window(prefix):
+    # Seconds from spawning the process until the window is mapped and until the grid is ready
+    started = time.perf_counter()
+    proc = subprocess.Popen(prefix + [sys.executable, "-c", WINDOW_SCRIPT], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    times = {}
+    for line in proc.stdout:
+        times[line.strip()] = time.perf_counter() - started
+    proc.wait()
+    if proc.returncode != 0 or "mapped" not in times:
+        raise RuntimeError(f"GUI process exited with {proc.returncode}")
+    return times["mapped"], times.get("ready", times["mapped"])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=100.0)
+    parser.add_argument("--max-window-ms", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    failed = False
+    imports = [measure_import() * 1000 for _ in range(args.runs)]
+    median = statistics.median(imports)
+    print(f"import      median {median:7.1f} ms  min {min(imports):7.1f} ms  budget {args.max_import_ms:.0f} ms")
+    if median > args.max_import_ms:
+        print("import time is over budget")
+        failed = True
+
+    prefix = display_prefix()
+    if prefix is None:
+        print("window      skipped: no display and xvfb-run is not installed")
+    else:
+        # xvfb-run itself takes a while to start a server, so its overhead is included
+        runs = [measure_window(prefix) for _ in range(args.runs)]
+        mapped = statistics.median(r[0] for r in runs) * 1000
+        ready = statistics.median(r[1] for r in runs) * 1000
+        print(f"window      median {mapped:7.1f} ms  (grid and icons ready {ready:.1f} ms)  budget {args.max_window_ms:.0f} ms")
+        if mapped > args.max_window_ms:
+            print("time to first window is over budget")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# Benchmark suite: downloads, catalog loading, grid rendering and saving, with the results
+# written to JSON so runs can be compared across releases.
+#   python benchmarks/run_suite.py                                # everything
+#   python benchmarks/run_suite.py --only download save --output before.json
+#   python benchmarks/run_suite.py --compare before.json          # exit 1 on regressions
+# Runs offline against standin_server.py inside a scratch directory; installers are never
+# launched because run_as_admin is replaced by a stub (which can pretend each install takes
+# --install-seconds, to see installs overlapping downloads). Downloads go through Install Selected
+# in the GUI when there is a display and through the headless install command otherwise.
+# Rendering needs a display: without one the suite re-runs itself under xvfb-run, and skips
+# the render benchmarks if that isn't installed.
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import BoresAppInstaller as bai
+from bench_catalog_load import synthetic_catalog
+from standin_server import StandinServer
+
+SUITE_VERSION = 1
+MB = 1024 * 1024
+
+# name: (server options, number of apps, bytes per app or a list of sizes to cycle through)
+DOWNLOAD_SCENARIOS = {
+    "single_64mb": ({}, 1, 64 * MB),
+    "redirects_capped": ({"bandwidth": 16 * MB, "latency": 0.03, "redirects": 2}, 4, 16 * MB),
+    "many_small": ({"latency": 0.05}, 30, MB // 2),
+    "mixed_sizes": ({"bandwidth": 16 * MB, "latency": 0.02}, 12, [96 * MB, MB, 2 * MB, MB // 2]),
+    "segmented_256mb": ({"bandwidth": 32 * MB}, 1, 256 * MB),
+}
+CATALOG_SIZES = [35, 1000, 10000, 100000]
+RENDER_SIZES = [35, 1000, 10000]
+SAVE_SIZES = [35, 1000, 10000, 100000]
+
+installs = []  # what the run_as_admin stub was asked to launch
+install_seconds = 0.0
+
+def stub_run_as_admin(exe, params='', wait=False):
+    installs.append(exe)
+    if wait:
+        time.sleep(install_seconds)
+        return 0
+
+def has_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY"))
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def write_catalog(count, **kwargs):
+    icons = sorted(name for name in os.listdir("icons") if name.lower().endswith(".png"))
+    with open("apps.json", "w") as f:
+        json.dump(synthetic_catalog(count, icons=icons, **kwargs), f, indent=2)
+    for leftover in ("apps.json" + bai.CATALOG_CACHE_SUFFIX, "apps.json" + bai.JOURNAL_SUFFIX):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+def fresh_dir(name):
+    # Scratch directory for one benchmark with a copy of the real icons (thumbnails not included)
+    path = os.path.join(WORK, name)
+    shutil.rmtree(path, ignore_errors=True)
+    shutil.copytree(os.path.join(ROOT, "icons"), os.path.join(path, "icons"), ignore=shutil.ignore_patterns(".thumbs"))
+    os.chdir(path)
+    return path
+
+def pump(root, done, timeout=600):
+    deadline = time.monotonic() + timeout
+    while not done():
+        if time.monotonic() > deadline:
+            raise TimeoutError("GUI did not finish in time")
+        root.update()
+        time.sleep(0.002)
+
+def make_gui():
+    root = bai.tk.Tk()
+    root.geometry("1200x700")
+    app = bai.AppInstallerGUI(root)
+    pump(root, lambda: app.columns and app.icon_job is None)
+    return root, app
+
+def bench_download(use_gui):
+    results = {}
+    for name, (options, count, size) in DOWNLOAD_SCENARIOS.items():
+        fresh_dir(f"download_{name}")
+        sizes = size if isinstance(size, list) else [size]
+        with StandinServer(**options) as server:
+            write_catalog(count, url=lambda i: server.url_for(f"app{i}", sizes[i % len(sizes)]))
+            installs.clear()
+            started = time.perf_counter()
+            if use_gui:
+                catalog = bai.load_catalog()
+                root, app = make_gui()
+                started = time.perf_counter()
+                app.install_mode.set("auto")
+                app.selected = {entry["id"] for entry in catalog}
+                app.install_selected()
+                pump(root, lambda: app.batch is None)
+                records = app.telemetry.last_run
+                app.on_close()
+            else:
+                events = []
+                # The real parser, so the install command's defaults (and any new flags) come along
+                args = bai.build_parser().parse_args(["install", "--mode", "auto"])
+                app_catalog = bai.Catalog.load()
+                args.apps = [app_catalog.label(e["id"]) for e in app_catalog]
+                bai.cli_install(args, lambda event, **fields: events.append((event, fields)))
+                records = [fields for event, fields in events if event == "timing"]
+            seconds = time.perf_counter() - started
+            total = sum(sizes[i % len(sizes)] for i in range(count))
+            results[name] = {
+                "apps": count,
+                "bytes": total,
+                "seconds": round(seconds, 4),
+                "first_ready_s": bai.run_times(records)[0],
+                "mb_per_s": round(total / MB / seconds, 2),
+                "requests": server.requests,
+                "bytes_sent": server.bytes_sent,
+                "installed": len(installs),
+            }
+        print(f"  download {name}: {results[name]['seconds']:.2f}s, {results[name]['mb_per_s']} MB/s, first ready {results[name]['first_ready_s']}s")
+    results["via"] = "gui" if use_gui else "cli"
+    return results
+
+def bench_catalog_load(repeat):
+    results = {}
+    fresh_dir("catalog")
+    for count in CATALOG_SIZES:
+        write_catalog(count)
+        json_s = best_of(repeat, lambda: bai.Catalog.load(cache=False))
+        bai.Catalog.load()  # builds apps.json.cache
+        cache_s = best_of(repeat, lambda: bai.Catalog.load())
+        results[str(count)] = {"json_s": round(json_s, 5), "cache_s": round(cache_s, 5)}
+        print(f"  catalog {count}: json {json_s * 1000:.1f} ms, cache {cache_s * 1000:.1f} ms")
+    return results
+
+def bench_render(repeat):
+    results = {}
+    for count in RENDER_SIZES:
+        fresh_dir(f"render_{count}")
+        write_catalog(count)
+        bai.load_catalog()
+        started = time.perf_counter()
+        root, app = make_gui()
+        first_s = time.perf_counter() - started  # window, grid and icons, thumbnails made from scratch
+
+        def render():
+            app.render_app_grid()
+            root.update_idletasks()
+
+        def scroll():
+            for fraction in (0.25, 0.5, 0.75, 0.0):
+                app.canvas.yview_moveto(fraction)
+                app.refresh_viewport()
+                root.update_idletasks()
+        render_s = best_of(repeat, render)
+        scroll_s = best_of(repeat, scroll) / 4
+        app.on_close()
+        results[str(count)] = {"first_s": round(first_s, 4), "render_s": round(render_s, 5), "scroll_s": round(scroll_s, 5)}
+        print(f"  render {count}: first {first_s * 1000:.0f} ms, render {render_s * 1000:.1f} ms, scroll {scroll_s * 1000:.1f} ms")
+    return results
+
+def bench_save(repeat):
+    # save_json itself only schedules a write; this times the CatalogStore work behind it
+    results = {}
+    fresh_dir("save")
+    for count in SAVE_SIZES:
+        write_catalog(count)
+        catalog = bai.Catalog.load(cache=False)
+        store = bai.CatalogStore(catalog)
+        entry = next(iter(catalog))
+        edits = 20
+
+        def journal_save():
+            for i in range(edits):
+                catalog.update(entry["id"], {"url": f"https://example.com/{i}.exe", "icon": "", "category": entry["category"]})
+                store.save()
+        journal_s = best_of(repeat, journal_save) / edits
+        full_s = best_of(repeat, lambda: store.write())
+        results[str(count)] = {"journal_save_s": round(journal_s, 6), "full_write_s": round(full_s, 5)}
+        print(f"  save {count}: journal {journal_s * 1000:.2f} ms/edit, full write {full_s * 1000:.1f} ms")
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(old, new, tolerance):
+    # Prints every timing that moved and returns how many got slower than tolerance allows
+    regressions = 0
+    def walk(old_node, new_node, path):
+        nonlocal regressions
+        for key, value in new_node.items():
+            if isinstance(value, dict) and isinstance(old_node.get(key), dict):
+                walk(old_node[key], value, path + [key])
+            elif key.endswith(("_s", "seconds")) and isinstance(old_node.get(key), (int, float)) and old_node[key] > 0:
+                ratio = value / old_node[key]
+                flag = "  SLOWER" if ratio > tolerance else ""
+                regressions += bool(flag)
+                print(f"  {'.'.join(path + [key]):<48} {old_node[key]:>10.5f} -> {value:>10.5f}  {ratio:5.2f}x{flag}")
+    walk(old.get("results", {}), new.get("results", {}), [])
+    return regressions
+
+def main():
+    global WORK, install_seconds
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="+", choices=["download", "catalog", "render", "save"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="where to write the JSON results (default: benchmarks/results/suite-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    parser.add_argument("--install-seconds", type=float, default=0.0, help="how long each stubbed installer runs")
+    args = parser.parse_args()
+
+    if not has_display() and shutil.which("xvfb-run") and not os.environ.get("BENCH_UNDER_XVFB"):
+        env = dict(os.environ, BENCH_UNDER_XVFB="1")
+        return subprocess.call(["xvfb-run", "-a", sys.executable] + sys.argv, env=env)
+
+    wanted = set(args.only or ["download", "catalog", "render", "save"])
+    bai.run_as_admin = stub_run_as_admin
+    install_seconds = args.install_seconds
+    display = has_display()
+    if display:
+        bai.load_tk()
+    output = os.path.abspath(args.output or os.path.join(ROOT, "benchmarks", "results", time.strftime("suite-%Y%m%d-%H%M%S.json")))
+    report = {
+        "suite_version": SUITE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "install_seconds": args.install_seconds,
+        "results": {},
+    }
+    WORK = tempfile.mkdtemp(prefix="bores-bench-")
+    try:
+        if "download" in wanted:
+            report["results"]["download"] = bench_download(display)
+        if "catalog" in wanted:
+            report["results"]["catalog_load"] = bench_catalog_load(args.repeat)
+        if "render" in wanted:
+            if display:
+                report["results"]["render"] = bench_render(args.repeat)
+            else:
+                report["results"]["render"] = {"skipped": "no display and xvfb-run is not installed"}
+                print("  render skipped: no display and xvfb-run is not installed")
+        if "save" in wanted:
+            report["results"]["save"] = bench_save(args.repeat)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(WORK, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f"{regressions} timing(s) regressed by more than {args.tolerance:.2f}x")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# Local HTTP stand-in for installer hosts, used by the benchmarks.
+# Serves synthetic installers of any size with optional per-connection bandwidth cap,
+# first-byte latency, redirect chains, Range support and dropped connections, so benchmarks run
+# offline and repeatably.
+# Every path serves the same installer; add ?size=N to a URL to get one of N bytes instead.
+import http.server
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+BLOCK = os.urandom(1024 * 1024)  # the synthetic installer is this block repeated
+
+def synthetic_bytes(start, end):
+    # Bytes [start, end) of the synthetic installer
+    out = bytearray()
+    while start < end:
+        offset = start % len(BLOCK)
+        piece = BLOCK[offset:offset + (end - start)]
+        out += piece
+        start += len(piece)
+    return bytes(out)
+
+class StandinServer:
+    # size: bytes served for every path
+    # bandwidth: bytes/sec per connection (None for unlimited)
+    # latency: seconds to wait before sending response headers (redirects included)
+    # redirects: how many 302 hops a request goes through before the installer is served
+    # ranges: advertise and honour Range requests
+    # cut_after: drop the connection after this many body bytes of the first GET for each path
+    # (None to never drop), so a client has to resume the rest
+    def __init__(self, size=16 * 1024 * 1024, bandwidth=None, latency=0.0, redirects=0, ranges=True, cut_after=None):
+        self.size = size
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.redirects = redirects
+        self.ranges = ranges
+        self.cut_after = cut_after
+        self.cut_paths = set()
+        self.bytes_sent = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/installer.exe"
+
+    def url_for(self, name, size=None):
+        # A distinct URL per app, optionally with its own size
+        query = f"?size={size}" if size is not None else ""
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/{name}.exe{query}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def make_handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.respond(send_body=False)
+
+            def do_GET(self):
+                self.respond(send_body=True)
+
+            def respond(self, send_body):
+                with server.lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                parts = urlsplit(self.path)
+                # Redirect chain: /x.exe -> /hop1/x.exe -> ... -> /hopN/x.exe, which is served
+                hop = re.match(r"/hop(\d+)(/.*)", parts.path)
+                hops, name = (int(hop.group(1)), hop.group(2)) if hop else (0, parts.path)
+                if hops < server.redirects:
+                    query = f"?{parts.query}" if parts.query else ""
+                    self.send_response(302)
+                    self.send_header("Location", f"/hop{hops + 1}{name}{query}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                size = int(parse_qs(parts.query).get("size", [server.size])[0])
+                start, end = 0, size
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if server.ranges and match:
+                    start = int(match.group(1))
+                    end = min(size, int(match.group(2)) + 1) if match.group(2) else size
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+                else:
+                    self.send_response(200)
+                if server.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(end - start))
+                self.send_header("ETag", f'"standin-{size}"')
+                self.end_headers()
+                if send_body:
+                    cut = False
+                    if server.cut_after is not None:
+                        with server.lock:
+                            cut = parts.path not in server.cut_paths
+                            server.cut_paths.add(parts.path)
+                    if cut and end - start > server.cut_after:
+                        end = start + server.cut_after
+                        self.close_connection = True
+                    self.send_body(start, end)
+
+            def send_body(self, start, end):
+                step = 64 * 1024
+                began = time.monotonic()
+                sent = 0
+                try:
+                    while start < end:
+                        block = synthetic_bytes(start, min(end, start + step))
+                        self.wfile.write(block)
+                        start += len(block)
+                        sent += len(block)
+                        with server.lock:
+                            server.bytes_sent += len(block)
+                        if server.bandwidth:
+                            ahead = sent / server.bandwidth - (time.monotonic() - began)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler